@@ -8,17 +8,39 @@
 ####################################################################################################
 
 import argparse
+import atexit
 import filecmp
 import fnmatch
 import getpass
+import hashlib
+import io
+import json
+import multiprocessing
 import os
 import re
+import signal
 import subprocess
 import shutil
 import sys
 import tempfile
 import time
 
+import file_finder
+import git
+
+
+# Matchers for the start and the end of a big comment marker (compiled once, as they are applied to
+# every line of every file). Files are scanned as bytes, so that they needn't be decoded.
+matcher_comment_marker_start = re.compile(br'^\/\*+$')
+matcher_comment_marker_end   = re.compile(br'^\*+\/$')
+
+# Only comment markers with at least this many stars are fixed automatically. Shorter ones (such as
+# the '/**' and ' */' delimiters of ordinary comments) are only reported.
+min_fixable_stars = 40
+
+# The error of the comment markers which are fixed even without '--fix' (typically the end of the
+# documentation comment of a method, indented by one space too many)
+default_fix_error = 'incorrect number of leading spaces (expected 4, found 5)'
 
 
 ####################################################################################################
@@ -26,23 +48,23 @@ import time
 #   Function to inspect a big comment marker line (either start or end of the comment marker).
 #
 #   Params:
-#       line = line containing the comment marker
+#       line = line containing the comment marker (bytes)
 #       indent = the expected indent of the comment marker
 #
 ####################################################################################################
 
 def inspect_big_comment_marker(line, indent):
     # Remove only the newline
-    line = line.rstrip('\n')
+    line = line.rstrip(b'\n')
 
     errors = []
 
-    num_leading_spaces = len(line) - len(line.lstrip(' '))
+    num_leading_spaces = len(line) - len(line.lstrip(b' '))
     if num_leading_spaces != indent:
         errors.append('incorrect number of leading spaces (expected ' + str(indent) + ', found ' +
             str(num_leading_spaces) + ')')
 
-    if line.endswith(' '):
+    if line.endswith(b' '):
         errors.append('trailing space(s) present')
 
     if len(line) != 80:
@@ -53,92 +75,483 @@ def inspect_big_comment_marker(line, indent):
 
 ####################################################################################################
 #
-#   Function to automatically fix certain lines in the given file.
+#   Function to make a correct big comment marker line.
+#
+#   Params:
+#       indent = the indent of the comment marker
+#       is_start = whether the comment marker is the start (as opposed to the end) of the comment
+#
+#   Returns:
+#       the comment marker line (without a newline), None if no correct line can be made for the
+#       given indent
+#
+####################################################################################################
+
+def makeBigCommentMarker(indent, is_start):
+    if indent < 0 or indent > 78:
+        return None
+
+    stars = '*' * (80 - indent - 1)
+
+    if is_start:
+        return ' ' * indent + '/' + stars
+
+    return ' ' * indent + stars + '/'
+
+
+####################################################################################################
+#
+#   Function to split the contents of a file into lines the way python 2 reads a file in text mode,
+#   i.e. only at '\n' (a lone '\r' doesn't end a line, and a '\r' before a '\n' is part of the line),
+#   so that the lines are numbered the same way whichever python version is used.
+#
+#   Params:
+#       contents = the contents of the file (bytes)
+#
+#   Returns:
+#       a list of the lines, including their newlines
+#
+####################################################################################################
+
+def splitLines(contents):
+    return io.BytesIO(contents).readlines()
+
+
+####################################################################################################
+#
+#   Function to automatically fix lines in the given file. All lines are fixed at once and the file
+#   is replaced atomically (i.e. the fixed contents are written to a temporary file which is then
+#   renamed to the file). The line endings and the permissions of the file are retained.
 #
 #   Params:
 #       file_orig = the file on which to perform the automatic fixes
-#       lines_to_fix = set containing the numbers of the lines to be fixed
-#       fixed_line = the replacement line (i.e. the correct line)
+#       fixed_lines = dictionary mapping the numbers of the lines to be fixed to their replacements
+#                     (i.e. the correct lines)
+#
+#   Returns:
+#       a set containing the numbers of the lines which were fixed
 #
 ####################################################################################################
 
-def performAutomaticFixes(file_orig, lines_to_fix, fixed_line):
-    # Make a copy of the file
-    file_copy = tmp_directory + '/file_copy'
-    shutil.copyfile(file_orig, file_copy)
+def performAutomaticFixes(file_orig, fixed_lines):
+    with open(file_orig, 'rb') as in_file:
+        # Split the lines the way they were split when the file was analysed
+        lines = splitLines(in_file.read())
 
-    with open(file_copy, 'r') as in_file, open(file_orig, 'w') as out_file:
-        line_num = 0
-        for line in in_file:
-            line_num += 1
-            if line_num in lines_to_fix:
-                line = fixed_line + '\n'
-            out_file.write(line)
+    lines_fixed = set()
+
+    for line_num, fixed_line in fixed_lines.items():
+        if line_num > len(lines):
+            continue
+
+        if not isinstance(fixed_line, bytes):
+            fixed_line = fixed_line.encode('ascii')
+
+        line = lines[line_num - 1]
+        content = line.rstrip(b'\r\n')
+
+        # Never replace anything but a big comment marker of the same kind (the file may have
+        # changed since it was analysed)
+        if content.strip()[:1] != fixed_line.strip()[:1]:
+            continue
+
+        lines[line_num - 1] = fixed_line + line[len(content):]
+        lines_fixed.add(line_num)
+
+    if not lines_fixed:
+        return lines_fixed
+
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(file_orig), prefix='.')
+
+    with os.fdopen(fd, 'wb') as out_file:
+        out_file.write(b''.join(lines))
+
+    shutil.copymode(file_orig, tmp_file)
+    os.rename(tmp_file, file_orig)
+
+    return lines_fixed
 
 
 ####################################################################################################
 #
-#   Function to analyse a file to determine which imports may not be necessary.
-#   It also acts upon the determined suggestions and makes changes to the file as necessary (the
-#   file is compiled after every edit and if the compilation fails, it is rolled back to its most
-#   recent compilable state).
+#   Function to analyse the big comment markers of a file. The file is read once, and its raw bytes
+#   are checked first: every big comment marker contains '/*' or '*/', so a file without either of
+#   them needn't be gone through line by line at all.
 #
 #   Params:
-#       file_orig = the file to be analysed
-#       compile_command = the command to be used for compiling the file
-#       tmp_directory = directory in which to create temporary files whenever needed
+#       filename = the file to be analysed
 #
 #   Returns:
-#       a set containing all errors
-#       (if the set is not made up of a single element pointing to an outright compilation error,
-#       then it should be thought of as a set of suggestions which could not be automatically
-#       applied)
+#       a tuple of the lines with errors and their fixes (see 'analyseFileLines()') and the hash of
+#       the analysed contents of the file (see 'getFileHash()')
 #
 ####################################################################################################
 
 def analyseFile(filename):
-    lines_with_errors = {}
+    with open(filename, 'rb') as in_file:
+        contents = in_file.read()
 
-    with open(filename, 'r') as in_file:
-        indent = 0
-        line_num = 0
+    file_hash = hashlib.sha1(contents).hexdigest()
 
-        matcher_comment_marker_start = r'^\/\*+$'
-        matcher_comment_marker_end   = r'^\*+\/$'
+    if b'/*' not in contents and b'*/' not in contents:
+        return ({}, {}, file_hash)
 
-        for line in in_file:
-            line_num += 1
+    lines_with_errors, fixed_lines = analyseFileLines(splitLines(contents))
 
-            orig_line = line
+    return (lines_with_errors, fixed_lines, file_hash)
 
-            line = line.strip()
 
-            if line == '{':
-                indent += 4
-                continue
-            elif line == '}':
-                indent -= 4
-                continue
+####################################################################################################
+#
+#   Function to analyse the big comment markers of a file, line by line.
+#
+#   Params:
+#       lines = the lines of the file (as split by 'splitLines()')
+#
+#   Returns:
+#       a tuple of a dictionary mapping the number of each line with errors to the list of its
+#       errors, and a dictionary mapping the number of each line with errors which can be fixed
+#       automatically (see 'min_fixable_stars') to its replacement (see 'performAutomaticFixes()')
+#
+####################################################################################################
+
+def analyseFileLines(lines):
+    lines_with_errors = {}
+    fixed_lines = {}
+
+    indent = 0
+    line_num = 0
 
-            is_big_comment_marker = False
+    for line in lines:
+        line_num += 1
 
-            m1 = re.search(matcher_comment_marker_start, line)
+        orig_line = line
+
+        line = line.strip()
+
+        if line == b'{':
+            indent += 4
+            continue
+        elif line == b'}':
+            indent -= 4
+            continue
+
+        is_big_comment_marker = False
+
+        # Only lines starting with '/' or '*' can be big comment markers, so don't bother matching
+        # the others
+        if line[:1] in (b'/', b'*'):
+            m1 = matcher_comment_marker_start.search(line)
             if m1:
                 is_big_comment_marker = True
             else:
-                m2 = re.search(matcher_comment_marker_end, line)
+                m2 = matcher_comment_marker_end.search(line)
                 if m2:
                     is_big_comment_marker = True
 
-            if is_big_comment_marker:
-                # print('inspecting line ' + str(line_num) + ' (indent = ' + # str(indent) + ')')
-                errors_in_line = []
-                errors_in_line = inspect_big_comment_marker(orig_line, indent)
+        if is_big_comment_marker:
+            # print('inspecting line ' + str(line_num) + ' (indent = ' + # str(indent) + ')')
+            errors_in_line = []
+            errors_in_line = inspect_big_comment_marker(orig_line, indent)
+
+            if errors_in_line:
+                lines_with_errors[line_num] = errors_in_line
+
+                fixed_line = None
+                if len(line) - 1 >= min_fixable_stars:
+                    fixed_line = makeBigCommentMarker(indent, line.startswith(b'/'))
+                if fixed_line is not None:
+                    fixed_lines[line_num] = fixed_line
+
+    return (lines_with_errors, fixed_lines)
+
+
+####################################################################################################
+#
+#   Function to analyse the given files, in parallel if so requested. The results are returned in
+#   the order of the given files, no matter in which order the files are analysed.
+#
+#   Params:
+#       files = list of files to be analysed
+#       jobs = number of files to be analysed in parallel
+#
+#   Returns:
+#       a generator of (file, lines with errors, fixes, hash (as returned by 'analyseFile()'))
+#       tuples
+#
+####################################################################################################
+
+def analyseFiles(files, jobs):
+    if jobs <= 1:
+        for f in files:
+            lines_with_errors, fixed_lines, file_hash = analyseFile(f)
+            yield (f, lines_with_errors, fixed_lines, file_hash)
+        return
+
+    # The workers rely on inheriting everything from this process, so they must always be forked
+    # (newer python 3 versions default to 'forkserver' on Linux). Ctrl-C is left to this process.
+    if hasattr(multiprocessing, 'get_context'):
+        pool = multiprocessing.get_context('fork').Pool(jobs, ignoreInterrupts)
+    else:
+        pool = multiprocessing.Pool(jobs, ignoreInterrupts)
+
+    # Most files are scanned very quickly, so hand them out in chunks to keep the overhead low
+    chunk_size = max(1, len(files) // (jobs * 16))
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+
+    try:
+        results = pool.imap(analyseChunk, chunks)
+
+        for chunk in chunks:
+            while True:
+                try:
+                    # The timeout is only there to keep the wait interruptible by Ctrl-C (python 2
+                    # blocks signals while waiting on a condition without a timeout)
+                    chunk_results = results.next(3600)
+                    break
+                except multiprocessing.TimeoutError:
+                    continue
+
+            for f, (lines_with_errors, fixed_lines, file_hash) in zip(chunk, chunk_results):
+                yield (f, lines_with_errors, fixed_lines, file_hash)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+####################################################################################################
+#
+#   Function to analyse a chunk of files in a worker process.
+#
+#   Params:
+#       files = list of files to be analysed
+#
+#   Returns:
+#       a list of the lines with errors, their fixes and the hash (as returned by 'analyseFile()') of
+#       each file
+#
+####################################################################################################
+
+def analyseChunk(files):
+    return [analyseFile(f) for f in files]
+
+
+####################################################################################################
+#
+#   Function to make a worker process ignore Ctrl-C (which is handled by the main process).
+#
+####################################################################################################
+
+def ignoreInterrupts():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+####################################################################################################
+#
+#   Function to get the directory in which state is kept across runs for the given project.
+#
+#   Params:
+#       cwd = the current working directory (i.e. the root of the project)
+#
+#   Returns:
+#       the path of the state directory (which may not exist yet)
+#
+####################################################################################################
+
+def getStateDirectory(cwd):
+    cache_home = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    project_id = hashlib.sha1(cwd.encode('utf-8')).hexdigest()[:16]
+
+    return os.path.join(cache_home, 'comment_markers', project_id)
+
+
+####################################################################################################
+#
+#   Function to get the version of the checker, i.e. a hash of this script. Cached results of another
+#   version of the checker are never used.
+#
+#   Returns:
+#       the version of the checker
+#
+####################################################################################################
+
+def getCheckerVersion():
+    with open(os.path.realpath(__file__), 'rb') as in_file:
+        script_hash = hashlib.sha1(in_file.read()).hexdigest()
+
+    return script_hash
+
+
+####################################################################################################
+#
+#   Function to get the hash of the contents of a file.
+#
+#   Params:
+#       filename = the file to be hashed
+#
+#   Returns:
+#       the SHA-1 hash of the contents of the file
+#
+####################################################################################################
+
+def getFileHash(filename):
+    with open(filename, 'rb') as in_file:
+        return hashlib.sha1(in_file.read()).hexdigest()
+
+
+####################################################################################################
+#
+#   Function to load the results of earlier runs.
+#
+#   Params:
+#       cache_file = file containing the results
+#
+#   Returns:
+#       a dictionary mapping each file to its cached result (see 'analyseFilesWithCache()'), empty
+#       if there are no results of this version of the checker
+#
+####################################################################################################
+
+def loadResultCache(cache_file):
+    if not os.path.isfile(cache_file):
+        return {}
+
+    try:
+        with open(cache_file, 'r') as in_file:
+            cache = json.load(in_file)
+    except ValueError:
+        print("Result cache '" + cache_file + "' is corrupt. Will ignore.")
+        return {}
+
+    if cache.get('version') != checker_version:
+        return {}
+
+    return cache['files']
+
+
+####################################################################################################
+#
+#   Function to save the results of this run (and those of earlier runs, as long as their files
+#   still exist).
+#
+#   Params:
+#       cache_file = file in which to save the results
+#       cache = dictionary mapping each file to its cached result
+#
+####################################################################################################
+
+def saveResultCache(cache_file, cache):
+    cache = {'version': checker_version,
+             'files': dict((f, entry) for f, entry in cache.items() if os.path.isfile(f))}
+
+    if not os.path.isdir(os.path.dirname(cache_file)):
+        os.makedirs(os.path.dirname(cache_file))
+
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file), prefix='.')
+
+    with os.fdopen(fd, 'w') as out_file:
+        json.dump(cache, out_file)
+
+    os.rename(tmp_file, cache_file)
+
 
-                if errors_in_line:
-                    lines_with_errors[line_num] = errors_in_line
+####################################################################################################
+#
+#   Function to get the cached result of a file, if it hasn't changed since it was scanned. The file
+#   is known to be unchanged if its size and modification time are unchanged, unless it was
+#   modified so shortly before being scanned that the modification time can't tell (in which case,
+#   as well as when only the modification time has changed, its contents are compared).
+#
+#   Params:
+#       cache = dictionary mapping each file to its cached result
+#       filename = the file whose result is to be got
+#
+#   Returns:
+#       a tuple of the lines with errors and their fixes (see 'analyseFileLines()'), None if there
+#       is no valid cached result
+#
+####################################################################################################
+
+def getCachedResult(cache, filename):
+    entry = cache.get(filename)
+
+    if entry is None:
+        return None
+
+    st = os.stat(filename)
+    if st.st_size != entry['size']:
+        return None
 
-    return lines_with_errors
+    if st.st_mtime != entry['mtime'] or entry['mtime'] > entry['scanned'] - 1:
+        check_time = time.time()
+        if getFileHash(filename) != entry['hash']:
+            return None
+        entry['mtime'] = st.st_mtime
+        entry['scanned'] = check_time
+
+    # Note that json turns the line numbers into strings
+    lines_with_errors = dict((int(line), errors)
+                             for line, errors in entry['lines_with_errors'].items())
+    fixed_lines = dict((int(line), fixed_line) for line, fixed_line in entry['fixed_lines'].items())
+
+    return (lines_with_errors, fixed_lines)
+
+
+####################################################################################################
+#
+#   Function to analyse the given files, using the cached results of the files which haven't
+#   changed since they were last scanned and caching the results of the others.
+#
+#   Each cached result is a dictionary containing the size, the modification time and the hash of
+#   the file, the time at which it was scanned, and the lines with errors and their fixes.
+#
+#   Params:
+#       files = list of files to be analysed
+#       jobs = number of files to be scanned in parallel
+#       cache = dictionary mapping each file to its cached result (None to not use the cache)
+#
+#   Returns:
+#       a generator of (file, lines with errors, fixes (see 'analyseFileLines()')) tuples, in the
+#       order of the given files
+#
+####################################################################################################
+
+def analyseFilesWithCache(files, jobs, cache):
+    if cache is None:
+        for f, lines_with_errors, fixed_lines, _ in analyseFiles(files, jobs):
+            yield (f, lines_with_errors, fixed_lines)
+        return
+
+    cached_results = {}
+    new_entries = {}
+
+    for f in files:
+        result = getCachedResult(cache, f)
+        if result is not None:
+            cached_results[f] = result
+        else:
+            # The size and the modification time are taken before the file is scanned, so that a
+            # change made while it is being scanned is noticed by the next run (the hash is that of
+            # the scanned contents)
+            scan_time = time.time()
+            st = os.stat(f)
+            new_entries[f] = {'size': st.st_size, 'mtime': st.st_mtime, 'scanned': scan_time}
+
+    scanned_results = analyseFiles([f for f in files if f in new_entries], jobs)
+
+    for f in files:
+        if f in cached_results:
+            lines_with_errors, fixed_lines = cached_results[f]
+        else:
+            _, lines_with_errors, fixed_lines, file_hash = next(scanned_results)
+
+            entry = new_entries[f]
+            entry['hash'] = file_hash
+            entry['lines_with_errors'] = lines_with_errors
+            entry['fixed_lines'] = fixed_lines
+            cache[f] = entry
+
+        yield (f, lines_with_errors, fixed_lines)
 
 
 ####################################################################################################
@@ -195,7 +608,8 @@ def removeProgressBar():
 #       filename = file containing the locations of other files
 #
 #   Returns:
-#       a set containing the absolute paths of all files found
+#       a set containing the absolute paths of all files found (normalised, so that they can be
+#       compared with the paths of the files found in the directory tree)
 #
 ####################################################################################################
 
@@ -216,9 +630,7 @@ def getFiles(cwd, filename):
                 print("File '" + line + "' (line " + str(line_num) + " in " + filename +
                     ") doesn't exist. Will ignore.")
             else:
-                if not os.path.isabs(line):
-                    line = cwd + "/" + line
-                files.add(line)
+                files.add(os.path.normpath(os.path.join(cwd, line)))
 
     return files
 
@@ -233,8 +645,37 @@ parser = argparse.ArgumentParser(usage='%(prog)s [ARGUMENTS]', description='Comm
 parser.add_argument('-n', '--non-interactive', action='store_true',
                     required = False, default = False,
                     help = 'Run for all files without waiting for user input')
+parser.add_argument('--fix', action='store_true', required = False, default = False,
+                    help = 'Automatically fix the errors in big comment markers (the expected ' +
+                    'indent is worked out from the lines consisting of just a brace, so ' +
+                    'review the changes). Markers indented by 5 spaces instead of 4 are always ' +
+                    'fixed.')
+parser.add_argument('-j', '--jobs', type=int, required = False, default = 1,
+                    help = 'Number of files to scan in parallel (default: 1). Only possible in ' +
+                    'non-interactive mode.')
+parser.add_argument('--no-cache', action='store_true', required = False, default = False,
+                    help = 'Always scan all files, neither using nor updating the results of ' +
+                    'earlier runs')
+parser.add_argument('--changed-since', required = False, default = None, metavar = 'REF',
+                    help = 'Only scan files changed since the given git reference')
 args = vars(parser.parse_args())
 
+# Note 'changed_since' instead of 'changed-since' since the hyphen is automatically converted to an
+# underscore
+if args['changed_since'] and not git.is_valid_commit(args['changed_since']):
+    print("'" + args['changed_since'] + "' is not a valid git commit. Aborting.")
+    sys.exit(1)
+
+if args['jobs'] < 1:
+    print("Number of jobs must be at least 1. Aborting.")
+    sys.exit(1)
+
+# Note 'non_interactive' instead of 'non-interactive' since the hyphen is automatically converted to
+# an underscore
+if args['jobs'] > 1 and not args['non_interactive']:
+    print("Files can only be scanned in parallel in non-interactive mode (-n). Aborting.")
+    sys.exit(1)
+
 cwd = os.getcwd()
 
 files = set()
@@ -243,15 +684,17 @@ if os.path.isfile(cwd + "/restrictlist.txt"):
     files = getFiles(cwd, "restrictlist.txt")
     print("Files to restrict   : " + str(len(files)))
 else:
-    for root, subdirs, filenames in os.walk(cwd):
-        for filename in fnmatch.filter(filenames, "*.d"):
-            files.add(os.path.join(root, filename))
+    files = file_finder.find_files(lambda names: fnmatch.filter(names, "*.d"))
     print("Total D files found : " + str(len(files)))
 
 files_to_skip = getFiles(cwd, "skiplist.txt")
 print("Files to skip       : " + str(len(files_to_skip)))
 files -= files_to_skip
 
+if args['changed_since']:
+    files &= file_finder.find_changed_files(args['changed_since'])
+    print("Files changed since '" + args['changed_since'] + "' : " + str(len(files)))
+
 if not files:
     print("No D files to analyse. Aborting.")
     sys.exit(2)
@@ -261,23 +704,51 @@ total_files = len(files)
 print("Files to analyse    : " + str(total_files))
 print("")
 
-tmp_directory = tempfile.mkdtemp()
+checker_version = getCheckerVersion()
+cache_file = os.path.join(getStateDirectory(cwd), 'results.json')
+
+# Note 'no_cache' instead of 'no-cache' since the hyphen is automatically converted to an underscore
+result_cache = None
+if not args['no_cache']:
+    result_cache = loadResultCache(cache_file)
+
+    # The results are saved however the run ends (e.g. by Ctrl-C), so that the files scanned so far
+    # needn't be scanned again by the next run
+    atexit.register(saveResultCache, cache_file, result_cache)
 
 files_done = 0
 files_with_errors = 0
 lines_auto_fixed = 0
 files_with_auto_fixed_lines = 0
+lines_fixable = 0
 
-for f in files:
-    updateProgress(files_done / float(total_files))
-
-    lines_with_errors = analyseFile(f)
+updateProgress(0.0)
 
+# The files are always reported in the same (sorted) order, however many jobs scan them
+for f, lines_with_errors, fixed_lines in analyseFilesWithCache(sorted(files), args['jobs'],
+                                                                 result_cache):
     files_done += 1
 
     if lines_with_errors:
         files_with_errors += 1
-        lines_to_fix = set()
+        lines_fixed = set()
+
+        # Note that all fixes of the file are applied at once, so that it is written only once
+        lines_to_fix = dict((line, fixed_line) for line, fixed_line in fixed_lines.items()
+                            if args['fix'] or default_fix_error in lines_with_errors[line])
+
+        if lines_to_fix:
+            lines_fixed = performAutomaticFixes(f, lines_to_fix)
+
+        lines_fixable += len(fixed_lines) - len(lines_to_fix)
+
+        if lines_fixed:
+            lines_auto_fixed += len(lines_fixed)
+            files_with_auto_fixed_lines += 1
+
+            # The file has changed, so its result must not be reused
+            if result_cache is not None:
+                result_cache.pop(f, None)
 
         removeProgressBar()
         print(f + ':')
@@ -285,20 +756,13 @@ for f in files:
         for line in sorted(lines_with_errors):
             print("    * line " + str(line))
             for error in lines_with_errors[line]:
-                if error == 'incorrect number of leading spaces (expected 4, found 5)':
-                    lines_to_fix.add(line)
-                    print("        - <auto fixed>")
+                if line in lines_fixed:
+                    print("        - <auto fixed> " + error)
                 else:
                     print("        - " + error)
 
         print('')
 
-        if lines_to_fix:
-            lines_auto_fixed += len(lines_to_fix)
-            files_with_auto_fixed_lines += 1
-            fixed_line = '    ***************************************************************************/'
-            performAutomaticFixes(f, lines_to_fix, fixed_line)
-
         # Note 'non_interactive' instead of 'non-interactive' since the hyphen is automatically
         # converted to an underscore
         if not args['non_interactive']:
@@ -307,6 +771,8 @@ for f in files:
             sys.stdout.write('\033[1A')
             dummy = getpass.getpass("")
 
+    updateProgress(files_done / float(total_files))
+
 removeProgressBar()
 
 print('Number of files analysed: ' + str(total_files))
@@ -314,6 +780,6 @@ print('Files with errors: ' + str(files_with_errors))
 if lines_auto_fixed > 0:
     print('Lines automatically fixed: ' + str(lines_auto_fixed) + ' (in ' +
         str(files_with_auto_fixed_lines) + ' files)')
-
-shutil.rmtree(tmp_directory)
+if lines_fixable > 0:
+    print('Lines which can be fixed automatically (--fix): ' + str(lines_fixable))
 
@@ -0,0 +1,923 @@
+#!/usr/bin/env python
+
+################################################################################
+#
+#   Description:
+#   ------------
+#       A minimal lexer for D sources, and a parser for the import statements,
+#       the module declaration and the declarations at module scope of a D
+#       module built on top of it.
+#
+#       The lexer knows just enough of D to never mistake the contents of
+#       comments (including nested '/+ +/' comments), strings and character
+#       literals for code. All positions are offsets into the source text, so
+#       that callers can edit the source using exact spans.
+#
+################################################################################
+
+import collections
+import re
+
+
+################################################################################
+#
+#   A single token of a D source. 'kind' is one of 'identifier', 'number',
+#   'string', 'comment' or 'punctuation'. 'start' and 'end' are offsets into
+#   the source, 'text' is the source between them.
+#
+################################################################################
+
+Token = collections.namedtuple('Token', ['kind', 'text', 'start', 'end'])
+
+
+################################################################################
+#
+#   An import statement, e.g. 'public import a.b, c = d.e : f, g;'.
+#
+#   'start' and 'end' span the whole statement, from its first attribute (or
+#   the 'import' keyword if there are no attributes) up to and including the
+#   terminating semicolon. 'attributes' is a list of the attribute tokens
+#   preceding the 'import' keyword (e.g. 'public', 'private', 'static'), and
+#   'modules' is a list of 'ImportedModule's.
+#
+################################################################################
+
+ImportStatement = collections.namedtuple('ImportStatement',
+    ['start', 'end', 'attributes', 'modules'])
+
+
+################################################################################
+#
+#   A single module imported by an import statement. 'name' is the fully
+#   qualified module name, 'alias' the name of a renamed import ('c' in
+#   'c = d.e', None otherwise) and 'bindings' a list of 'ImportBinding's of a
+#   selective import (None if the import is not selective).
+#
+#   'start' and 'end' span the alias, the module name and the bindings,
+#   'name_end' is the end of the module name.
+#
+################################################################################
+
+ImportedModule = collections.namedtuple('ImportedModule',
+    ['name', 'alias', 'bindings', 'start', 'name_end', 'end'])
+
+
+################################################################################
+#
+#   A single symbol of a selective import. 'name' is the imported symbol and
+#   'alias' the name under which it is imported ('f' in 'f = g', None
+#   otherwise).
+#
+################################################################################
+
+ImportBinding = collections.namedtuple('ImportBinding',
+    ['name', 'alias', 'start', 'end'])
+
+
+# Attributes which can precede the 'import' keyword of an import statement
+import_attributes = frozenset(['public', 'private', 'package', 'protected',
+                               'static'])
+
+token_matcher = re.compile(r'''
+    (?P<whitespace> \s+ )
+  | (?P<line_comment> //[^\n]* )
+  | (?P<block_comment> /\*.*?(?:\*/|\Z) )
+  | (?P<nested_comment> /\+ )
+  | (?P<string> (?:r"[^"]*"|`[^`]*`|x"[^"]*"|"(?:\\.|[^\\"])*")[cwd]?
+              | '(?:\\.|[^\\'])*' )
+  | (?P<identifier> [A-Za-z_][A-Za-z0-9_]* )
+  | (?P<number> 0[xX][0-9a-fA-F_]+[a-zA-Z]*
+              | [0-9][0-9_]*(?:\.[0-9][0-9_]*)?(?:[eE][+-]?[0-9]+)?[a-zA-Z]* )
+  | (?P<punctuation> . )
+''', re.VERBOSE | re.DOTALL)
+
+nested_comment_matcher = re.compile(r'/\+|\+/')
+
+
+################################################################################
+#
+#   Finds the end of a nested comment
+#
+#   Params:
+#       text = the D source
+#       start = offset of the '/+' starting the comment
+#
+#   Returns:
+#       the offset just after the '+/' ending the comment (the end of the
+#       text if the comment is not terminated)
+#
+################################################################################
+
+def find_nested_comment_end(text, start):
+    depth = 0
+    pos = start
+
+    while True:
+        m = nested_comment_matcher.search(text, pos)
+        if m is None:
+            return len(text)
+
+        depth += 1 if m.group(0) == '/+' else -1
+        pos = m.end()
+
+        if depth == 0:
+            return pos
+
+
+################################################################################
+#
+#   Splits a D source into tokens (whitespace is dropped)
+#
+#   Params:
+#       text = the D source
+#
+#   Returns:
+#       a list of 'Token's
+#
+################################################################################
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    length = len(text)
+
+    while pos < length:
+        m = token_matcher.match(text, pos)
+        kind = m.lastgroup
+        end = m.end()
+
+        if kind == 'nested_comment':
+            end = find_nested_comment_end(text, pos)
+            kind = 'comment'
+        elif kind == 'line_comment' or kind == 'block_comment':
+            kind = 'comment'
+
+        if kind != 'whitespace':
+            tokens.append(Token(kind, text[pos:end], pos, end))
+
+        pos = end
+
+    return tokens
+
+
+################################################################################
+#
+#   Gets the tokens which are code, i.e. all tokens except comments
+#
+#   Params:
+#       tokens = list of tokens as returned by 'tokenize()'
+#
+#   Returns:
+#       a list of the code tokens
+#
+################################################################################
+
+def code_tokens(tokens):
+    return [t for t in tokens if t.kind != 'comment']
+
+
+################################################################################
+#
+#   Gets the set of all identifiers among the given tokens, except those lying
+#   within the given spans (e.g. the import statements)
+#
+#   Params:
+#       tokens = list of tokens as returned by 'tokenize()' (in source order)
+#       excluded_spans = sorted list of (start, end) tuples of the spans to skip
+#       members = whether to include identifiers following a '.', i.e. members
+#                 and the components of qualified names
+#
+#   Returns:
+#       the set of identifiers
+#
+################################################################################
+
+def identifier_set(tokens, excluded_spans=(), members=True):
+    identifiers = set()
+    spans = iter(excluded_spans)
+    span = next(spans, None)
+    previous = None
+
+    for token in tokens:
+        while span is not None and span[1] <= token.start:
+            span = next(spans, None)
+
+        follows_dot = previous is not None and previous.text == '.'
+        if token.kind != 'comment':
+            previous = token
+
+        if token.kind != 'identifier':
+            continue
+
+        if span is not None and span[0] <= token.start:
+            continue
+
+        if follows_dot and not members:
+            continue
+
+        identifiers.add(token.text)
+
+    return identifiers
+
+
+################################################################################
+#
+#   Parses a (possibly qualified) name starting at the given token
+#
+#   Params:
+#       code = list of code tokens
+#       i = index of the first token of the name
+#
+#   Returns:
+#       a tuple of the name and the index of the token after the name (the name
+#       is None if there is no identifier at the given index)
+#
+################################################################################
+
+def parse_qualified_name(code, i):
+    if i >= len(code) or code[i].kind != 'identifier':
+        return (None, i)
+
+    parts = [code[i].text]
+    i += 1
+
+    while (i + 1 < len(code) and code[i].text == '.' and
+           code[i + 1].kind == 'identifier'):
+        parts.append(code[i + 1].text)
+        i += 2
+
+    return ('.'.join(parts), i)
+
+
+################################################################################
+#
+#   Parses the body of an import statement, i.e. everything after the 'import'
+#   keyword
+#
+#   Params:
+#       code = list of code tokens
+#       i = index of the first token after the 'import' keyword
+#
+#   Returns:
+#       a tuple of the list of 'ImportedModule's and the index of the
+#       terminating semicolon (None if the statement could not be parsed)
+#
+################################################################################
+
+def parse_import_body(code, i):
+    modules = []
+
+    while True:
+        alias = None
+        start_token = i
+
+        if (i + 1 < len(code) and code[i].kind == 'identifier' and
+                code[i + 1].text == '='):
+            alias = code[i].text
+            i += 2
+
+        name, i = parse_qualified_name(code, i)
+        if name is None or i >= len(code):
+            return (None, None)
+
+        name_end = code[i - 1].end
+        bindings = None
+
+        if code[i].text == ':':
+            bindings = []
+            i += 1
+
+            while True:
+                binding_alias = None
+                binding_start = code[i].start if i < len(code) else None
+
+                if (i + 1 < len(code) and code[i].kind == 'identifier' and
+                        code[i + 1].text == '='):
+                    binding_alias = code[i].text
+                    i += 2
+
+                if i >= len(code) or code[i].kind != 'identifier':
+                    return (None, None)
+
+                bindings.append(ImportBinding(code[i].text, binding_alias,
+                                              binding_start, code[i].end))
+                i += 1
+
+                if i < len(code) and code[i].text == ',':
+                    i += 1
+                    continue
+                break
+
+        modules.append(ImportedModule(name, alias, bindings,
+                                      code[start_token].start, name_end,
+                                      code[i - 1].end))
+
+        if i >= len(code):
+            return (None, None)
+
+        if code[i].text == ';':
+            return (modules, i)
+
+        # Only the last module of a statement can have bindings
+        if code[i].text != ',' or bindings is not None:
+            return (None, None)
+
+        i += 1
+
+
+################################################################################
+#
+#   Parses all import statements of a D source
+#
+#   Params:
+#       text = the D source
+#       tokens = the tokens of the source (optional, to avoid tokenizing the
+#                source again)
+#
+#   Returns:
+#       a list of 'ImportStatement's in the order in which they appear
+#
+################################################################################
+
+def parse_imports(text, tokens=None):
+    if tokens is None:
+        tokens = tokenize(text)
+
+    code = code_tokens(tokens)
+    statements = []
+
+    for i, token in enumerate(code):
+        if token.kind != 'identifier' or token.text != 'import':
+            continue
+
+        # 'import("file")' is an import expression, not an import statement
+        if i + 1 < len(code) and code[i + 1].text == '(':
+            continue
+
+        modules, end = parse_import_body(code, i + 1)
+        if modules is None:
+            continue
+
+        first = i
+        while (first > 0 and code[first - 1].kind == 'identifier' and
+               code[first - 1].text in import_attributes):
+            first -= 1
+
+        statements.append(ImportStatement(code[first].start, code[end].end,
+                                          code[first:i], modules))
+
+    return statements
+
+
+################################################################################
+#
+#   Gets the declarations of a D source which are at module scope, i.e. not
+#   within an aggregate or a function. Blocks of attributes and of conditional
+#   compilation (e.g. 'public { }', 'version (X) { } else { }') are looked into,
+#   as their contents are still at module scope. The members of anonymous enums
+#   are declared at module scope as well.
+#
+#   This is not a parser of D declarations, but a heuristic which finds the
+#   names of the usual ones (aggregates, templates, enums, aliases, functions
+#   and variables). Names of mixins and of declarations generated by them are
+#   not found.
+#
+#   Params:
+#       text = the D source
+#       tokens = the tokens of the source (optional, to avoid tokenizing the
+#                source again)
+#       public_only = whether to leave out the 'private' and 'package'
+#                     declarations, i.e. those which other modules can't see
+#
+#   Returns:
+#       the set of the declared names
+#
+################################################################################
+
+def parse_declarations(text, tokens=None, public_only=False):
+    if tokens is None:
+        tokens = tokenize(text)
+
+    names = set()
+
+    def add_names(statement, protection):
+        if not public_only or protection not in hidden_protections:
+            names.update(declared_names(statement))
+
+    # One entry per open brace: 'module' if its contents are at module scope,
+    # 'enum' for the members of an anonymous enum, None otherwise
+    scopes = []
+    # The protection of the declarations without a protection attribute, one
+    # entry per open brace plus one for the module itself (e.g. 'private'
+    # after 'private:' or within 'private { }')
+    protections = ['public']
+    statement = []
+    nesting = 0
+
+    for token in code_tokens(tokens):
+        scope = scopes[-1] if scopes else 'module'
+
+        if scope is None:
+            if token.text == '{':
+                scopes.append(None)
+                protections.append(protections[-1])
+            elif token.text == '}':
+                scopes.pop()
+                protections.pop()
+            continue
+
+        if nesting > 0 or token.text in ('(', '['):
+            # Braces within parentheses or brackets (e.g. of a delegate
+            # literal) are part of the statement
+            if token.text in ('(', '[', '{'):
+                nesting += 1
+            elif token.text in (')', ']', '}'):
+                nesting -= 1
+            statement.append(token)
+            continue
+
+        if scope == 'enum':
+            if token.text in (',', '}'):
+                add_names(statement, protections[-1])
+                statement = []
+                if token.text == '}':
+                    scopes.pop()
+                    protections.pop()
+            else:
+                statement.append(token)
+        elif token.text == ';':
+            add_names(statement, get_protection(statement, protections[-1]))
+            statement = []
+        elif token.text == '{':
+            protection = get_protection(statement, protections[-1])
+            declaration = strip_attributes(statement)
+            if len(declaration) == 0:
+                scopes.append('module')
+            elif (declaration[0].text == 'enum' and
+                  (len(declaration) == 1 or declaration[1].text == ':')):
+                scopes.append('enum')
+            else:
+                add_names(statement, protection)
+                scopes.append(None)
+            protections.append(protection)
+            statement = []
+        elif token.text == '}':
+            if scopes:
+                scopes.pop()
+                protections.pop()
+            statement = []
+        elif token.text == ':' and len(strip_attributes(statement)) == 0:
+            # An attribute applying to the rest of the scope, e.g. 'public:'
+            protections[-1] = get_protection(statement, protections[-1])
+            statement = []
+        else:
+            statement.append(token)
+
+    return names
+
+
+# Attributes (and conditional compilation keywords) which can precede a
+# declaration, or a block of declarations
+declaration_attributes = frozenset(['public', 'private', 'package', 'protected',
+                                    'export', 'static', 'extern', 'align',
+                                    'deprecated', 'final', 'abstract',
+                                    'override', 'synchronized', 'auto',
+                                    'scope', 'const', 'immutable', 'shared',
+                                    '__gshared', 'nothrow', 'pure', 'ref',
+                                    'version', 'debug', 'if', 'else', 'pragma'])
+
+# Protection attributes
+protection_attributes = frozenset(['public', 'private', 'package', 'protected',
+                                   'export'])
+
+# Protections of the declarations which other modules can't see
+hidden_protections = frozenset(['private', 'package'])
+
+# Type constructors, which are not attributes when followed by parentheses
+type_constructors = frozenset(['const', 'immutable', 'shared', 'inout'])
+
+# Keywords which declare the name following them
+aggregate_keywords = frozenset(['class', 'struct', 'union', 'interface',
+                                'template'])
+
+# Keywords starting statements at module scope which don't declare any names
+# (e.g. 'import', 'unittest', 'static this()', 'static assert()')
+undeclaring_keywords = frozenset(['import', 'module', 'unittest', 'invariant',
+                                  'this', '~', 'mixin', 'assert'])
+
+# Keywords which can be followed by parentheses, but are not names of functions
+parenthesised_keywords = frozenset(['function', 'delegate', 'typeof', 'const',
+                                    'immutable', 'shared', 'inout', 'is',
+                                    '__traits', 'mixin', 'cast', 'new',
+                                    'this', 'super', 'assert'])
+
+
+################################################################################
+#
+#   Strips the attributes (along with their arguments, e.g. 'extern (C)' or
+#   'static if (x)') from the start of a statement
+#
+#   Params:
+#       statement = list of code tokens of the statement
+#
+#   Returns:
+#       the rest of the statement
+#
+################################################################################
+
+def strip_attributes(statement):
+    i = 0
+
+    while i < len(statement):
+        token = statement[i]
+        has_arguments = i + 1 < len(statement) and statement[i + 1].text == '('
+
+        if token.text == '@' and i + 1 < len(statement):
+            i += 2
+        elif (token.kind == 'identifier' and
+              token.text in declaration_attributes and
+              not (has_arguments and token.text in type_constructors)):
+            i += 1
+        else:
+            break
+
+        if i < len(statement) and statement[i].text == '(':
+            depth = 0
+            while i < len(statement):
+                if statement[i].text in ('(', '[', '{'):
+                    depth += 1
+                elif statement[i].text in (')', ']', '}'):
+                    depth -= 1
+                i += 1
+                if depth == 0:
+                    break
+
+    return statement[i:]
+
+
+################################################################################
+#
+#   Gets the protection of a statement, i.e. that given by its last protection
+#   attribute (e.g. 'private' in 'private static int x')
+#
+#   Params:
+#       statement = list of code tokens of the statement
+#       default = protection of the statement if it has no protection attribute
+#
+#   Returns:
+#       the protection of the statement
+#
+################################################################################
+
+def get_protection(statement, default):
+    protection = default
+    num_attribute_tokens = len(statement) - len(strip_attributes(statement))
+
+    for token in statement[:num_attribute_tokens]:
+        if token.kind == 'identifier' and token.text in protection_attributes:
+            protection = token.text
+
+    return protection
+
+
+################################################################################
+#
+#   Gets the names declared by a single statement at module scope
+#
+#   Params:
+#       statement = list of code tokens of the statement, up to (but not
+#                   including) its terminating semicolon or body
+#
+#   Returns:
+#       a list of the declared names
+#
+################################################################################
+
+def declared_names(statement):
+    declaration = strip_attributes(statement)
+
+    if len(declaration) == 0 or declaration[0].text in undeclaring_keywords:
+        if (len(declaration) > 2 and declaration[0].text == 'mixin' and
+                declaration[1].text == 'template'):
+            return [declaration[2].text]
+        return []
+
+    if declaration[0].text in aggregate_keywords:
+        if len(declaration) > 1 and declaration[1].kind == 'identifier':
+            return [declaration[1].text]
+        return []
+
+    if declaration[0].text == 'enum':
+        if (len(declaration) > 1 and declaration[1].kind == 'identifier' and
+                (len(declaration) == 2 or declaration[2].text == ':')):
+            return [declaration[1].text]
+        declaration = declaration[1:]
+    elif declaration[0].text in ('alias', 'typedef'):
+        declaration = declaration[1:]
+
+    def is_name(token):
+        return (token is not None and token.kind == 'identifier' and
+                token.text not in parenthesised_keywords)
+
+    # Functions: the name before the parameters. Variables: the names before
+    # each initializer and comma (e.g. 'int a = 1, b;'). Other declarations:
+    # the last name.
+    names = []
+    depth = 0
+    previous = None
+    in_initializer = False
+
+    for token in declaration:
+        if depth > 0:
+            if token.text in ('(', '[', '{'):
+                depth += 1
+            elif token.text in (')', ']', '}'):
+                depth -= 1
+            continue
+
+        if token.text == '(' and not in_initializer and is_name(previous):
+            names.append(previous.text)
+            return names
+
+        if token.text in ('(', '[', '{'):
+            depth += 1
+        elif token.text == '=' and not in_initializer:
+            if is_name(previous):
+                names.append(previous.text)
+            in_initializer = True
+        elif token.text == ',':
+            if not in_initializer and is_name(previous):
+                names.append(previous.text)
+            in_initializer = False
+
+        previous = token
+
+    if not in_initializer and is_name(previous):
+        names.append(previous.text)
+
+    return names
+
+
+# Keywords after which a name is not being declared (e.g. 'return x;')
+non_declaring_keywords = frozenset(['return', 'throw', 'goto', 'case', 'else',
+                                    'do', 'in', 'out', 'is', 'new', 'delete',
+                                    'cast', 'assert', 'typeof', 'body', 'if',
+                                    'while', 'for', 'switch', 'with',
+                                    'version', 'debug', 'mixin', 'import',
+                                    'module', 'break', 'continue'])
+
+
+################################################################################
+#
+#   Gets the names declared anywhere in a D source: not only at module scope,
+#   but also the fields of aggregates, the parameters of functions and lambdas,
+#   the local variables and the variables of 'foreach' loops.
+#
+#   Like 'parse_declarations()', this is a heuristic. A name counts as declared
+#   if it follows a type (a name which is not a keyword, or a closing bracket)
+#   and precedes one of '=', ';', ',', ')' or '(' (e.g. 'int x;', 'string[] s,'
+#   or 'void f(') or if it follows an attribute and precedes '=' (e.g. 'auto x
+#   = 1').
+#
+#   Params:
+#       tokens = list of tokens as returned by 'tokenize()' (in source order)
+#
+#   Returns:
+#       the set of the declared names
+#
+################################################################################
+
+def declared_identifiers(tokens):
+    code = code_tokens(tokens)
+    names = set()
+
+    def is_assignment(i):
+        # '=', but not '==' or '=>'
+        return (i < len(code) and code[i].text == '=' and
+                (i + 1 == len(code) or code[i + 1].text not in ('=', '>')))
+
+    def is_lambda_arrow(i):
+        return (i + 1 < len(code) and code[i].text == '=' and
+                code[i + 1].text == '>')
+
+    def add_list_names(start, terminators):
+        # Adds the last name of each item of the list starting after the
+        # opening parenthesis at index 'start', up to the first terminator
+        depth = 0
+        for i in range(start + 1, len(code)):
+            if code[i].text in ('(', '[', '{'):
+                depth += 1
+            elif depth > 0 and code[i].text in (')', ']', '}'):
+                depth -= 1
+            elif depth == 0 and code[i].text in terminators + (',',):
+                if code[i - 1].kind == 'identifier':
+                    names.add(code[i - 1].text)
+                if code[i].text != ',':
+                    return
+
+    for i, token in enumerate(code):
+        if token.text in ('foreach', 'foreach_reverse'):
+            if i + 1 < len(code) and code[i + 1].text == '(':
+                add_list_names(i + 1, (';', ')'))
+            continue
+
+        if token.text == ')' and is_lambda_arrow(i + 1):
+            # The parameters of a lambda, e.g. '(a, b) => a + b'
+            depth = 0
+            for j in range(i, -1, -1):
+                if code[j].text == ')':
+                    depth += 1
+                elif code[j].text == '(':
+                    depth -= 1
+                if depth == 0:
+                    add_list_names(j, (')',))
+                    break
+            continue
+
+        if token.kind != 'identifier' or i == 0:
+            continue
+
+        if is_lambda_arrow(i + 1):
+            names.add(token.text)
+            continue
+
+        previous = code[i - 1]
+
+        if previous.text in non_declaring_keywords:
+            continue
+
+        if (previous.text in declaration_attributes or
+                previous.text in ('enum', 'alias')):
+            if is_assignment(i + 1):
+                names.add(token.text)
+        elif previous.kind == 'identifier' or previous.text == ']':
+            if (is_assignment(i + 1) or
+                    (i + 1 < len(code) and
+                     code[i + 1].text in (';', ',', ')', '('))):
+                names.add(token.text)
+
+    return names
+
+
+################################################################################
+#
+#   Parses the module declaration of a D source
+#
+#   Params:
+#       text = the D source
+#       tokens = the tokens of the source (optional, to avoid tokenizing the
+#                source again)
+#
+#   Returns:
+#       the name of the module, None if there is no module declaration
+#
+################################################################################
+
+def parse_module_name(text, tokens=None):
+    if tokens is None:
+        tokens = tokenize(text)
+
+    code = code_tokens(tokens)
+
+    for i, token in enumerate(code):
+        if token.kind == 'identifier' and token.text == 'module':
+            name, end = parse_qualified_name(code, i + 1)
+            if name is not None and end < len(code) and code[end].text == ';':
+                return name
+
+    return None
+
+
+################################################################################
+#
+#   Gets the span to remove in order to remove a whole import statement. If
+#   the statement is alone on its line(s), apart from an optional trailing line
+#   comment, the whole line(s) are removed.
+#
+#   Params:
+#       text = the D source
+#       statement = the statement to remove
+#
+#   Returns:
+#       a (start, end) tuple of the span to remove
+#
+################################################################################
+
+def statement_removal_span(text, statement):
+    line_start = text.rfind('\n', 0, statement.start) + 1
+    line_end = text.find('\n', statement.end)
+    if line_end == -1:
+        line_end = len(text)
+
+    before = text[line_start:statement.start]
+    after = text[statement.end:line_end]
+
+    if before.strip() == '' and (after.strip() == '' or
+                                 after.strip().startswith('//')):
+        return (line_start, min(line_end + 1, len(text)))
+
+    return (statement.start, statement.end)
+
+
+################################################################################
+#
+#   Gets the spans to remove in order to remove some items of a comma separated
+#   list (e.g. the modules of an import statement), along with the commas
+#   separating them. At least one item must be kept.
+#
+#   Params:
+#       items = list of the items (anything with 'start' and 'end' offsets)
+#       removed = set of the indexes of the items to remove
+#
+#   Returns:
+#       a list of (start, end) tuples of the spans to remove
+#
+################################################################################
+
+def list_removal_spans(items, removed):
+    last_kept = max(i for i in range(len(items)) if i not in removed)
+
+    # Items before the last kept item are removed along with the comma and
+    # whitespace following them
+    spans = [(items[i].start, items[i + 1].start) for i in removed
+             if i < last_kept]
+
+    # Items after the last kept item are removed along with the comma preceding
+    # the first of them
+    if last_kept < len(items) - 1:
+        spans.append((items[last_kept].end, items[-1].end))
+
+    return spans
+
+
+################################################################################
+#
+#   Gets the spans to remove in order to remove some modules and/or selectively
+#   imported symbols from an import statement. A module is removed if all its
+#   symbols are removed, and the whole statement is removed if all its modules
+#   are removed.
+#
+#   Params:
+#       text = the D source
+#       statement = the statement to edit
+#       removals = set of (module index, symbol index) tuples of the items to
+#                  remove, with a symbol index of None to remove a whole module
+#
+#   Returns:
+#       a list of (start, end) tuples of the spans to remove
+#
+################################################################################
+
+def import_removal_spans(text, statement, removals):
+    removed_modules = set()
+    spans = []
+
+    for index, module in enumerate(statement.modules):
+        if (index, None) in removals:
+            removed_modules.add(index)
+        elif module.bindings:
+            removed_bindings = set(b for b in range(len(module.bindings))
+                                   if (index, b) in removals)
+
+            if len(removed_bindings) == len(module.bindings):
+                removed_modules.add(index)
+            elif removed_bindings:
+                spans += list_removal_spans(module.bindings, removed_bindings)
+
+    if len(removed_modules) == len(statement.modules):
+        return [statement_removal_span(text, statement)]
+
+    if removed_modules:
+        spans += list_removal_spans(statement.modules, removed_modules)
+
+    return spans
+
+
+################################################################################
+#
+#   Removes the given spans from a text. Overlapping spans are merged.
+#
+#   Params:
+#       text = the text to edit
+#       spans = list of (start, end) tuples of the spans to remove
+#
+#   Returns:
+#       the edited text
+#
+################################################################################
+
+def remove_spans(text, spans):
+    pieces = []
+    pos = 0
+
+    for start, end in sorted(spans):
+        if start > pos:
+            pieces.append(text[pos:start])
+        pos = max(pos, end)
+
+    pieces.append(text[pos:])
+
+    return ''.join(pieces)
+
+
+# vim: set tw=80 :
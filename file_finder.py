@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+################################################################################
+#
+#   Description:
+#   ------------
+#       Functions to find the files to be checked below the current directory.
+#       In a git repository, the files are taken from git (so that ignored
+#       files, the '.git' directory and submodules are never looked at).
+#       Elsewhere, the directory tree is walked, skipping hidden directories.
+#
+################################################################################
+
+import os
+
+import git
+
+
+################################################################################
+#
+#   Finds the files below the current directory with the given names
+#
+#   Params:
+#       filter_names = function which filters a list of file names (without
+#                      directories), returning only the names of the files to
+#                      be found (e.g. 'lambda names: fnmatch.filter(names,
+#                      "*.d")')
+#
+#   Returns:
+#       a set containing the absolute paths of all files found
+#
+################################################################################
+
+def find_files(filter_names):
+    paths = None
+
+    try:
+        git_top = git.in_repo()
+    except OSError:
+        # git isn't installed
+        git_top = ""
+
+    if git_top:
+        try:
+            paths = [os.path.abspath(f) for f in git.list_files()]
+        except git.GitException as e:
+            print("Git command '{}' failed with the following error:".format(
+                e.args[0]))
+            print(e.args[1].rstrip('\n'))
+            print("Will search all directories instead.")
+
+    if paths is None:
+        paths = []
+        for root, subdirs, filenames in os.walk(os.getcwd()):
+            # Prune hidden directories (e.g. '.git') from the walk
+            subdirs[:] = [d for d in subdirs if not d.startswith('.')]
+            paths += [os.path.join(root, f) for f in filenames]
+
+    wanted_names = set(filter_names(list(set(os.path.basename(p)
+                                             for p in paths))))
+
+    # Files which are tracked by git but deleted in the working tree are listed
+    # by git as well, so check that the files really exist
+    return set(p for p in paths
+               if os.path.basename(p) in wanted_names and os.path.isfile(p))
+
+
+################################################################################
+#
+#   Finds the files which have changed since the given git commit (see
+#   'git.get_changed_files()')
+#
+#   Params:
+#       ref = the commit to compare the working tree with
+#
+#   Returns:
+#       a set containing the absolute paths of the changed files
+#
+################################################################################
+
+def find_changed_files(ref):
+    git_top = git.in_repo()
+
+    return set(os.path.abspath(os.path.join(git_top, f))
+               for f in git.get_changed_files(ref))
+
+
+# vim: set tw=80 :
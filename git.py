@@ -199,4 +199,53 @@ def get_user_email():
         return ""
     return user_email
 
+
+################################################################################
+#
+#   Gets the files which differ between the given commit and the working tree,
+#   including untracked files which are not ignored
+#
+#   Params:
+#       ref = the commit to compare the working tree with
+#
+#   Returns:
+#       A list of the paths of the changed files, relative to the top-level
+#       directory of the repository. An empty list if an error occurred.
+#
+################################################################################
+
+def get_changed_files(ref):
+    try:
+        changed = run_command('diff', '--name-only', '-z', ref, '--')
+        untracked = run_command('ls-files', '-z', '--others',
+                                '--exclude-standard', '--full-name')
+    except GitException as e:
+        print("Git command '{}' failed with the following error:".format(e.args[0]))
+        print(e.args[1].rstrip('\n'))
+        return []
+
+    # The paths are NUL-separated (so that git doesn't quote unusual paths)
+    return [f for f in changed.split('\0') + untracked.split('\0') if f]
+
+
+################################################################################
+#
+#   Gets the files of the working tree below the current directory, i.e. the
+#   tracked files and the untracked files which are not ignored (the contents
+#   of submodules are not included)
+#
+#   Returns:
+#       A list of the paths of the files, relative to the current directory
+#
+#   Throws:
+#       GitException if the git command failed
+#
+################################################################################
+
+def list_files():
+    files = run_command('ls-files', '-z', '--cached', '--others',
+                        '--exclude-standard')
+    return [f for f in files.split('\0') if f]
+
+
 # vim: set tw=80 :
@@ -8,16 +8,28 @@
 ####################################################################################################
 
 import argparse
-import filecmp
+import atexit
+import difflib
 import fnmatch
+import hashlib
+import io
+import json
+import multiprocessing
+import multiprocessing.pool
 import os
 import re
+import signal
 import subprocess
 import shutil
 import sys
 import tempfile
+import threading
 import time
 
+import d_lexer
+import git
+import inotify
+
 
 
 ####################################################################################################
@@ -50,13 +62,15 @@ def getProjectSpecificFlags(cwd):
 #
 #   Params:
 #       cwd = the current working directory
+#       interface_files_directory = if given, directory containing generated interface files, which
+#                                   is searched for imported modules before all other directories
 #
 #   Returns:
 #       the compilation command to be used (does not contain the filename)
 #
 ####################################################################################################
 
-def getCompileCommand(cwd):
+def getCompileCommand(cwd, interface_files_directory=None):
     submods = []
 
     if not os.path.isdir(cwd + "/submodules"):
@@ -96,6 +110,9 @@ def getCompileCommand(cwd):
     # compile_command.append("-o")
     # compile_command.append("/dev/null")
 
+    if interface_files_directory:
+        compile_command.append("-I" + interface_files_directory)
+
     compile_command.append("-I" + cwd + "/src")
 
     compile_command.append("-I" + cwd + "/build/devel/include")
@@ -108,557 +125,3137 @@ def getCompileCommand(cwd):
 
 ####################################################################################################
 #
-#   Function to compile a file.
+#   Function to get the directory in which state is kept across runs for the given project.
 #
 #   Params:
-#       filename = the file to be compiled
-#       compile_command = command to be used for the compilation
-#       debug_flags = set of additional debug flags present in the file
-#       save_stderr = whether to save stderr output or not
+#       cwd = the current working directory (i.e. the root of the project)
 #
 #   Returns:
-#       the return code of the result of compilation
+#       the path of the state directory (which may not exist yet)
 #
 ####################################################################################################
 
-def compileFile(filename, compile_command, debug_flags, save_stderr=False):
-    local_compile_command = compile_command[:]
+def getStateDirectory(cwd):
+    cache_home = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    project_id = hashlib.sha1(cwd.encode('utf-8')).hexdigest()[:16]
 
-    for flag in debug_flags:
-        local_compile_command.append("-debug=" + flag)
+    return os.path.join(cache_home, 'imports_analyser', project_id)
 
-    local_compile_command.append(filename)
 
-    with open(os.devnull, 'w') as devnull:
-        stderr_file = open(tmp_directory + "/stderr.txt", 'w') if save_stderr else devnull
-        return_code = subprocess.call(local_compile_command, stdout=devnull, stderr=stderr_file)
+####################################################################################################
+#
+#   Function to get the directory in which to create the scratch directory of a run (the workspaces,
+#   the stderr outputs of the compilations, ...). A tmpfs (i.e. '/dev/shm') is preferred, as the
+#   files in there are written over and over again, unless TMPDIR says otherwise.
+#
+#   Returns:
+#       the directory in which to create the scratch directory, None for the system default
+#
+####################################################################################################
 
-    return return_code
+def getScratchParentDirectory():
+    if 'TMPDIR' not in os.environ and os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+
+    return None
 
 
 ####################################################################################################
 #
-#   Function used to search for and delete the statement importing the given symbol.
+#   Function to get all D files in the given include directories. The result is remembered, as the
+#   set of files does not change during a run.
 #
 #   Params:
-#       symbol = symbol whose import statement is to be deleted
-#       filename = file in which to search
+#       include_dirs = list of include directories
+#
+#   Returns:
+#       a sorted list of the D files (including interface files) in the include directories
 #
 ####################################################################################################
 
-def searchAndDeleteSymbolImport(symbol, filename):
-    tmp_file_tuple = tempfile.mkstemp()
-    tmp_file = tmp_file_tuple[1]
+def getIncludeFiles(include_dirs):
+    key = tuple(include_dirs)
 
-    with open(filename, 'r') as in_file, open(tmp_file, 'w') as out_file:
-        skip_line = False
-
-        for line in in_file:
-            skip_line = False
-
-            if ('import' in line) and (symbol in line) and (';' in line):
-                if (',' not in line):
-                    # This is the only symbol imported in this line, so this whole line can be
-                    # deleted
-                    skip_line = True
-                else:
-                    # There are other symbols also imported in this line, so we must delete only the
-                    # symbol we're looking for
-                    if (':' in line):
-                        begin_matcher = r'\s' + re.escape(symbol) + r'\s*,\s*'
-                        middle_matcher = r',\s*' + re.escape(symbol) + r'\s*,\s*'
-                        end_matcher = r'\s*,\s*' + re.escape(symbol) + r'\s*'
-                    else:
-                        begin_matcher = r'\s.*' + re.escape(symbol) + r'\s*,\s*'
-                        middle_matcher = r',.*' + re.escape(symbol) + r'\s*,\s*'
-                        end_matcher = r'\s*,\s*.*' + re.escape(symbol) + r'\s*'
+    if key not in include_files_cache:
+        include_files = []
 
-                    if re.search(middle_matcher, line):
-                        line = re.sub(middle_matcher, ', ', line)
-                    elif re.search(begin_matcher, line):
-                        line = re.sub(begin_matcher, ' ', line)
-                    elif re.search(end_matcher, line):
-                        line = re.sub(end_matcher, '', line)
+        for include_dir in include_dirs:
+            for root, subdirs, filenames in os.walk(include_dir):
+                for filename in filenames:
+                    if filename.endswith(".d") or filename.endswith(".di"):
+                        include_files.append(os.path.abspath(os.path.join(root, filename)))
 
-            if (not skip_line):
-                out_file.write(line)
+        include_files_cache[key] = sorted(include_files)
 
-    shutil.move(tmp_file, filename)
+    return include_files_cache[key]
 
 
 ####################################################################################################
 #
-#   Function to search for and delete the first occurrence of the given import statement. This
-#   function is used only when an import statement occurs multiple times in a file.
+#   Function to get the hash of the contents of a file. Hashes are remembered along with the size
+#   and modification time of the file, so a file is only read again once it has changed.
 #
 #   Params:
-#       imp = the import statement to be deleted
-#       skip_count = the number of times the given import statement should be skipped (i.e. retained
-#                    as is and not treated as a match)
-#       filename = file in which to search
+#       filename = the file to be hashed
+#
+#   Returns:
+#       the hash as a hex string, None if the file couldn't be read
 #
 ####################################################################################################
 
-def searchAndDeleteFirstImport(imp, skip_count, filename):
-    tmp_file_tuple = tempfile.mkstemp()
-    tmp_file = tmp_file_tuple[1]
+def getFileHash(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
 
-    with open(filename, 'r') as in_file, open(tmp_file, 'w') as out_file:
-        done = False
-
-        for line in in_file:
-            if (not done) and ("import" in line) and (imp in line):
-                if (skip_count > 0):
-                    skip_count -= 1
-                    out_file.write(line)
-                else:
-                    # The current line is not written to the output file (effectively deleting it).
+    signature = (st.st_size, st.st_mtime, st.st_ino)
+    cached = file_hash_cache.get(filename)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
 
-                    # Set the done flag so that all remaining lines in the file are blindly written
-                    # to the output file.
-                    done = True
-            else:
-                out_file.write(line)
+    with open(filename, 'rb') as in_file:
+        file_hash = hashlib.sha1(in_file.read()).hexdigest()
 
-    shutil.move(tmp_file, filename)
+    file_hash_cache[filename] = (signature, file_hash)
+    return file_hash
 
 
 ####################################################################################################
 #
-#   Function that attempts to automatically perform selective imports. It is called when it is known
-#   that an import is not used within the file, but removing it causes a build failure. The symbols
-#   to be selectively imported are gathered from the stderr output of the failed build.
+#   Function to get a fingerprint of the contents of all D files in the given include directories.
+#   The fingerprint is only computed again once the files have been changed (see
+#   'noteIncludeFilesChanged()'), rather than checking every file each time it is needed.
 #
 #   Params:
-#       filename = the file being analysed
-#       symbol = symbol from which selective imports are to be attempted
-#       compile_command = command to be used for the compilation
-#       debug_flags = set of additional debug flags present in the file
+#       include_dirs = list of include directories
 #
 #   Returns:
-#       whether the attempt to perform selective imports was successful or not
+#       the fingerprint as a hex string
 #
 ####################################################################################################
 
-def attemptSelectiveImports(filename, symbol, compile_command, debug_flags):
-    # Make a backup copy of the file
-    file_orig = tmp_directory + '/selective_imports_bak_file'
-    shutil.copyfile(filename, file_orig)
-
-    symbols_to_import = set()
-
-    with open(tmp_directory + "/stderr.txt", 'r') as in_file:
-        # Example error:
-        #     File.d(3): Error: undefined identifier ID, did you mean function myID?
-        matcher_with_suggestion = r'.*Error: undefined identifier (.*), did you mean .*'
-
-        # Example error:
-        #     File.d(3): Error: undefined identifier ID
-        matcher_without_suggestion = r'.*Error: undefined identifier (.*)'
-
-        for line in in_file:
-            # Note that you must apply 'matcher_with_suggestion' first, because
-            # 'matcher_without_suggestion' will match all with_suggestion cases as well
-            m1 = re.search(matcher_with_suggestion, line)
-            if m1:
-                symbols_to_import.add(m1.group(1))
-            else:
-                m2 = re.search(matcher_without_suggestion, line)
-                if m2:
-                    symbols_to_import.add(m2.group(1))
-
-    csv_symbols_to_import = ""
-    for s in symbols_to_import:
-        csv_symbols_to_import += s + ", "
-    # Remove the extra ', ' added at the end
-    csv_symbols_to_import = csv_symbols_to_import.rstrip()
-    csv_symbols_to_import = csv_symbols_to_import.rstrip(',')
+def getIncludeFingerprint(include_dirs):
+    key = tuple(include_dirs)
+    generation = include_generation.value
 
-    tmp_file_tuple = tempfile.mkstemp()
-    tmp_file = tmp_file_tuple[1]
+    cached = include_fingerprint_cache.get(key)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
 
-    with open(filename, 'r') as in_file, open(tmp_file, 'w') as out_file:
-        for line in in_file:
-            matcher = r'^import (.*)' + re.escape(symbol) + r';'
-            m = re.search(matcher, line)
-            if m:
-                new_import_line = "import " + m.group(1) + symbol + " : " + csv_symbols_to_import + ";"
-                line = re.sub(matcher, new_import_line, line)
+    digest = hashlib.sha1()
 
-            out_file.write(line)
+    for include_file in getIncludeFiles(include_dirs):
+        file_hash = getFileHash(include_file)
+        if file_hash is not None:
+            digest.update(('\0' + include_file + ' ' + file_hash).encode('utf-8'))
 
-    shutil.move(tmp_file, filename)
+    include_fingerprint_cache[key] = (generation, digest.hexdigest())
+    return digest.hexdigest()
 
-    return_code = compileFile(filename, compile_command, debug_flags)
 
-    if return_code != 0:
-        # The selective imports didn't do the trick, so revert to the original
-        shutil.copyfile(file_orig, filename)
-        return False
+####################################################################################################
+#
+#   Function to be called whenever D files in the include directories of the real tree have been
+#   changed (or created, or deleted), so that their fingerprint is computed again (by this process
+#   and by all worker processes) the next time it is needed. When this process changes the files
+#   itself, it calls the function before the change as well, so that compilations running meanwhile
+#   don't cache their results (see 'compileFile()').
+#
+####################################################################################################
 
-    return True
+def noteIncludeFilesChanged():
+    include_generation.value += 1
 
 
 ####################################################################################################
 #
-#   Function to gather all symbols of interest in the given line.
+#   Function to get the key under which the result of a compilation is cached. The key covers the
+#   contents of the compiled file, the full compilation command and the contents of every D file in
+#   the include directories of the command. (Modules found only through the compiler's own
+#   configuration are assumed not to change between runs.)
+#
+#   Compilations in a workspace are cached under the paths of the real tree (along with the files
+#   which differ between the workspace and the real tree), so that the results can be shared between
+#   workspaces and with compilations in the real tree.
 #
 #   Params:
-#       line = the line from which to gather symbols
+#       filename = the file to be compiled
+#       local_compile_command = the full compilation command (including the filename)
 #
 #   Returns:
-#       a list containing all the gathered symbols
+#       the cache key as a hex string
 #
 ####################################################################################################
 
-def gatherSymbols(line):
-    if (len(line) == 0):
-        return []
+def getCompileCacheKey(filename, local_compile_command):
+    digest = hashlib.sha1()
 
-    # Remove all spaces
-    rex = re.compile(r'\s+')
-    line = rex.sub('', line)
+    with open(filename, 'rb') as in_file:
+        digest.update(hashlib.sha1(in_file.read()).hexdigest().encode('utf-8'))
 
-    # Get rid of the last character (',' or ';')
-    line = line.rstrip(',;')
+    local_compile_command = getRealCommand(local_compile_command)
+    digest.update('\0'.join(local_compile_command).encode('utf-8'))
 
-    symbols = []
+    include_dirs = [arg[2:] for arg in local_compile_command if arg.startswith("-I")]
+    digest.update(getIncludeFingerprint(include_dirs).encode('utf-8'))
 
-    if (":" in line):
-        # Selective import statement, gather all symbols after the colon
-        symbols = line.split(':')[1].split(',')
-    elif ("=" in line):
-        # Named import statement. First remove the 'import' keyword in the beginning, if it exists
-        if line.startswith('import'):
-            line = line[6:]
-
-        # Gather the symbol before the equals sign
-        # We need to do an explicit 'split()' at the end to convert the single symbol to a list
-        symbols = line.split('=')[0].split()
-    else:
-        # Regular import statement, gather a single symbol, i.e. the module name
-        # We need to do an explicit 'split()' at the end to convert the single symbol to a list
-        symbols = line.split('.')[-1].split()
+    for real_path in sorted(workspace_private_files):
+        file_hash = getFileHash(workspace_private_files[real_path])
+        if file_hash != getFileHash(real_path):
+            digest.update(('\0' + real_path + ' ' + str(file_hash)).encode('utf-8'))
 
-    return symbols
+    return digest.hexdigest()
 
 
 ####################################################################################################
 #
-#   Function to analyse a file to determine which imports may not be necessary.
-#   It also acts upon the determined suggestions and makes changes to the file as necessary (the
-#   file is compiled after every edit and if the compilation fails, it is rolled back to its most
-#   recent compilable state).
+#   Function to look up a cached compilation result. A hit marks the entry as recently used.
 #
 #   Params:
-#       file_orig = the file to be analysed
-#       compile_command = the command to be used for compiling the file
-#       tmp_directory = directory in which to create temporary files whenever needed
+#       key = the cache key of the compilation
 #
 #   Returns:
-#       a set containing all errors
-#       (if the set is not made up of a single element pointing to an outright compilation error,
-#       then it should be thought of as a set of suggestions which could not be automatically
-#       applied)
+#       a tuple of the return code and the stderr output of the compilation, None if there is no
+#       cached result
 #
 ####################################################################################################
 
-def analyseFile(file_orig, compile_command, tmp_directory):
-
-    errors = set()
-
-    return_code = compileFile(file_orig, compile_command, [])
-
-    if return_code != 0:
-        # If compilation fails at this stage, it means that some modification made to another file
-        # previously has caused a problem in this file. This is reason enough to abort and call for
-        # manual intervention.
-        errors.add("BUILD FAILURE")
-        return errors
+def lookupCompileCache(key):
+    entry_file = os.path.join(compile_cache_directory, key)
 
-    in_import_stmt = False
-    is_public_import = False
-
-    imports = []
-    imported_symbols = []
-    symbols_seen = set()
-    debug_flags = set()
+    try:
+        with open(entry_file, 'r') as in_file:
+            entry = json.load(in_file)
+        os.utime(entry_file, None)
+    except (IOError, OSError, ValueError):
+        return None
 
-    # Make a copy of the file
-    file_copy = tmp_directory + '/file_copy'
-    shutil.copyfile(file_orig, file_copy)
+    return (entry['return_code'], entry['stderr'])
 
-    with open(file_copy, 'r') as in_file, open(file_orig, 'w') as out_file:
-        line_num = 0
-        skip_line = False
 
-        for line in in_file:
-            line_num += 1
+####################################################################################################
+#
+#   Function to store a compilation result in the cache.
+#
+#   Params:
+#       key = the cache key of the compilation
+#       return_code = the return code of the compilation
+#       stderr = the stderr output of the compilation
+#
+####################################################################################################
 
-            orig_line = line
+def storeInCompileCache(key, return_code, stderr):
+    # Concurrent readers never see a partially written entry, as it is replaced atomically
+    saveJson(os.path.join(compile_cache_directory, key),
+             {'return_code': return_code, 'stderr': stderr})
 
-            line = line.strip()
 
-            if (len(line) == 0):
-                out_file.write(orig_line)
-                continue
+####################################################################################################
+#
+#   Function to trim the compile cache down to the given size by removing the least recently used
+#   entries.
+#
+#   Params:
+#       cache_directory = the directory containing the compile cache
+#       max_bytes = the maximum total size of the cache entries
+#
+####################################################################################################
 
-            if (line.startswith("//")):
-                out_file.write(orig_line)
-                continue
+def trimCompileCache(cache_directory, max_bytes):
+    entries = []
+    total_bytes = 0
 
-            if "import" in line:
-                rex = re.compile(r'\s{2,}')
-                line = rex.sub(' ', line)
+    for entry in os.listdir(cache_directory):
+        entry_file = os.path.join(cache_directory, entry)
+        try:
+            st = os.stat(entry_file)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, entry_file))
+        total_bytes += st.st_size
 
-                # Sanity checks to see if this is indeed an import statement
-                three_parts = line.split(' ', 2)
+    entries.sort()
 
-                split_count = len(three_parts)
-                if (split_count == 1):
-                    if (three_parts[0] == "import"):
-                        # 'import' is the only word in the line - assume it is a valid import
-                        # statement
-                        in_import_stmt = True
-                    out_file.write(orig_line)
-                    continue
-                else:
-                    if (three_parts[0] == "import"):
-                        # 'import' is the first word in the line - assume it is a valid import
-                        # statement
-                        in_import_stmt = True
-                        line = three_parts[1] if (split_count == 2) else three_parts[1] + three_parts[2]
-                    elif (three_parts[1] == "import"):
-                        # 'import' is the second word in the line - but we'll take it as a valid
-                        # import statement only if it preceded by 'private' or 'public'
-                        line = "" if (split_count == 2) else three_parts[2]
-                        if (three_parts[0] == "private"):
-                            # It's a 'private import' - valid import statement, but the 'private'
-                            # keyword is redundant, so remove it.
-                            in_import_stmt = True
-                            rex = re.compile(r'private\s+')
-                            orig_line = rex.sub('', orig_line)
-                        elif (three_parts[0] == "public"):
-                            # It's a 'public import' - also valid import statement.
-                            in_import_stmt = True
-                            is_public_import = True
-
-            if (in_import_stmt):
-                # Don't gather symbols from public imports, so that public imports are never touched
-                if not is_public_import:
-                    imported_symbols += gatherSymbols(line)
-                if (";" in line):
-                    in_import_stmt = False
-                    is_public_import = False
-                if (len(line)):
-                    # Get rid of the last character (',' or ';')
-                    line = line.rstrip(',;')
-                    imports.append(line)
-            else:
-                for symbol in imported_symbols:
-                    if symbol in line:
-                        symbols_seen.add(symbol)
+    for mtime, size, entry_file in entries:
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(entry_file)
+        except OSError:
+            pass
+        total_bytes -= size
 
-            if "debug" in line:
-                # Remove all spaces
-                rex = re.compile(r'\s+')
-                line = rex.sub('', line)
 
-                # Get the word in the parentheses after debug (matching inside the parentheses is
-                # done in a non-greedy manner using '?')
-                m = re.search(r'debug\((.*?)\)', line)
-                if m:
-                    debug_flags.add(m.group(1))
+####################################################################################################
+#
+#   Function to write an event to the trace file (if tracing is enabled). Events are written as JSON
+#   lines in the Chrome trace event format, and each event is written by a single 'write()' to the
+#   file opened in append mode, so that events of different processes and threads never interleave.
+#
+#   Params:
+#       event = dictionary describing the event
+#
+####################################################################################################
 
-            out_file.write(orig_line)
+def writeTraceEvent(event):
+    if trace_fd is None:
+        return
 
-    return_code = compileFile(file_orig, compile_command, debug_flags)
+    line = json.dumps(event, sort_keys=True) + "\n"
+    if not isinstance(line, bytes):
+        line = line.encode('utf-8')
 
-    if return_code != 0:
-        # Revert to original file
-        shutil.copyfile(file_copy, file_orig)
-    else:
-        # Update the file copy with the modified version
-        shutil.copyfile(file_orig, file_copy)
+    os.write(trace_fd, line)
 
-    imports_to_delete = []
 
-    imports_set = set(imports)
+####################################################################################################
+#
+#   Function to add a run of the compiler (or a cached result standing in for one) to the totals of
+#   the file currently being analysed, and to record it in the trace file (if tracing is enabled).
+#
+#   Params:
+#       purpose = why the compilation was done (e.g. "first-pass", "symbol removal")
+#       files = list of the compiled files
+#       debug_flags = set of additional debug flags used for the compilation
+#       start_time = time at which the compilation started
+#       return_code = the return code of the compilation
+#       cache = "hit" if the result was taken from the compile cache, "miss" if the compiler was
+#               run and its result cached, "off" if the compile cache is disabled
+#
+####################################################################################################
 
-    for imp in imports_set:
-        occurrence_count = imports.count(imp)
-        if (occurrence_count > 1):
-            imports_to_delete.append([imp, occurrence_count-1])
+def traceCompile(purpose, files, debug_flags, start_time, return_code, cache):
+    duration = time.time() - start_time
 
-    if len(imports_to_delete):
-        for imp_with_count in imports_to_delete:
-            del_count = 0
-            num_fail = 0
+    with trace_lock:
+        if traced_file_totals is not None:
+            traced_file_totals['compiles'] += 1
+            traced_file_totals['compile_seconds'] += duration
+            if cache == "hit":
+                traced_file_totals['cache_hits'] += 1
 
-            while del_count < imp_with_count[1]:
-                searchAndDeleteFirstImport(imp_with_count[0], num_fail, file_orig)
+    if trace_fd is None:
+        return
 
-                return_code = compileFile(file_orig, compile_command, debug_flags)
+    writeTraceEvent({
+        'name': purpose,
+        'cat': 'compile',
+        'ph': 'X',
+        'ts': int(start_time * 1000000),
+        'dur': int(duration * 1000000),
+        'pid': os.getpid(),
+        'tid': threading.current_thread().ident,
+        'args': {
+            'files': [getRealPath(f) for f in files],
+            'analysed_file': traced_file,
+            'debug_flags': sorted(debug_flags),
+            'return_code': return_code,
+            'cache': cache,
+        },
+    })
 
-                if return_code != 0:
-                    num_fail += 1
-                    # Revert
-                    shutil.copyfile(file_copy, file_orig)
-                else:
-                    shutil.copyfile(file_orig, file_copy)
 
-                del_count += 1
+####################################################################################################
+#
+#   Function to print a summary of the trace file: the number of compilations by purpose and the
+#   files which took the longest to analyse.
+#
+#   Params:
+#       trace_file = the trace file
+#       count = number of slowest files to print
+#
+####################################################################################################
 
-            if num_fail != 0:
-                errors.add("    * '" + imp_with_count[0] + "' appears " + str(num_fail + 1) + " times")
+def printTraceSummary(trace_file, count=10):
+    compiles = {}
+    cache_hits = 0
+    analysed = []
 
-    shutil.copyfile(file_orig, file_copy)
+    with open(trace_file, 'r') as in_file:
+        for line in in_file:
+            event = json.loads(line)
+
+            if event['cat'] == 'compile':
+                compiles[event['name']] = compiles.get(event['name'], 0) + 1
+                if event['args']['cache'] == "hit":
+                    cache_hits += 1
+            elif event['cat'] == 'analysis':
+                analysed.append(event)
+
+    print("Number of compilations: " + str(sum(compiles.values())) + " (" + str(cache_hits) +
+          " from the compile cache)")
+    for purpose in sorted(compiles):
+        print("    " + purpose + ": " + str(compiles[purpose]))
+    print("")
 
-    # For some symbols, we never attempt to perform selective imports. However, we still see if the
-    # whole import line can be removed.
-    # The corresponding import statements are:
-    #     import krill.channels.Channels;
-    #     import ocean.util.serialize.contiguous.MultiVersionDecorator;
-    #     import ocean.io.Stdout;
-    #     import ocean.transition;
-    #     import ocean.core.Test;
-    non_selective_import_symbols = ['Channels', 'MultiVersionDecorator', 'Stdout', 'transition',
-        'Test']
+    if not analysed:
+        return
 
-    symbols_not_seen = set(imported_symbols) - symbols_seen
-    if (len(symbols_not_seen)):
-        symbol_del_fail = set()
+    print("Slowest files:")
+    for event in sorted(analysed, key=lambda e: e['dur'], reverse=True)[:count]:
+        print("    {0:8.2f}s {1:5d} compilations  {2}".format(event['dur'] / 1000000.0,
+              event['args']['compiles'], event['args']['file']))
+    print("")
 
-        for symbol in symbols_not_seen:
-            searchAndDeleteSymbolImport(symbol, file_orig)
 
-            if filecmp.cmp(file_orig, file_copy):
-                symbol_del_fail.add(symbol)
-                continue
+####################################################################################################
+#
+#   Function to compile a file. If the compile cache is enabled, the result of an identical earlier
+#   compilation is used instead of running the compiler.
+#
+#   Params:
+#       filename = the file to be compiled
+#       compile_command = command to be used for the compilation
+#       debug_flags = set of additional debug flags present in the file
+#       purpose = why the file is compiled (recorded in the trace file)
+#       tmp_directory = if given, the stderr output is saved to 'stderr.txt' in this directory
+#
+#   Returns:
+#       the return code of the result of compilation
+#
+####################################################################################################
 
-            return_code = compileFile(file_orig, compile_command, debug_flags, True)
+def compileFile(filename, compile_command, debug_flags, purpose, tmp_directory=None):
+    start_time = time.time()
+    local_compile_command = getLocalCompileCommand(filename, compile_command, debug_flags)
 
-            if return_code != 0:
-                # Revert
-                shutil.copyfile(file_copy, file_orig)
+    key = None
+    cached = None
 
-                if symbol in non_selective_import_symbols:
-                    # Do nothing
-                    pass
-                elif args['library']:
-                    symbol_del_fail.add(symbol)
-                else:
-                    if not attemptSelectiveImports(file_orig, symbol, compile_command, debug_flags):
-                        symbol_del_fail.add(symbol)
-            else:
-                shutil.copyfile(file_orig, file_copy)
+    if compile_cache_directory:
+        generation = include_generation.value
+        key = getCompileCacheKey(filename, local_compile_command)
+        cached = lookupCompileCache(key)
 
-        if len(symbol_del_fail):
-            for symbol in symbol_del_fail:
-                errors.add("    * '" + symbol + "' imported but unused (selective imports possible?)")
+    if cached is not None:
+        return_code, stderr = cached
+    else:
+        with open(os.devnull, 'w') as devnull:
+            proc = subprocess.Popen(local_compile_command, stdout=devnull, stderr=subprocess.PIPE)
+            stderr = proc.communicate()[1].decode('utf-8', 'replace')
+            return_code = proc.returncode
+
+        # The result is only cached if the inputs didn't change while the compiler was running
+        # (e.g. because a file was applied to the real tree), as it may not match the key otherwise
+        if (key is not None and include_generation.value == generation and
+                getCompileCacheKey(filename, local_compile_command) == key):
+            storeInCompileCache(key, return_code, stderr)
+
+    if tmp_directory:
+        with io.open(tmp_directory + "/stderr.txt", 'w', encoding='utf-8') as stderr_file:
+            stderr_file.write(stderr)
+
+    if cached is not None:
+        cache = "hit"
+    else:
+        cache = "miss" if key is not None else "off"
+    traceCompile(purpose, [filename], debug_flags, start_time, return_code, cache)
 
-    return errors
+    return return_code
 
 
 ####################################################################################################
 #
-#   Function to display a progress bar to indicate the status of the program.
+#   Function to form the full command used for compiling a single file.
 #
 #   Params:
-#       progress = a floating point integer between 0 and 1 indicating how much of the program is
-#                  done (0 implies nothing is done, 1 implies the program is complete)
+#       filename = the file to be compiled
+#       compile_command = command to be used for the compilation
+#       debug_flags = set of additional debug flags present in the file
 #
 #   Returns:
-#       a set containing all errors (to be thought of as a set of suggestions)
+#       the full compilation command (including the filename)
 #
 ####################################################################################################
 
-def updateProgress(progress):
-    bar_len = 80 # Modify this to change the length of the progress bar
-
-    if not isinstance(progress, float):
-        return
-
-    if progress < 0:
-        progress = 0
-    elif progress >= 1:
-        progress = 1
+def getLocalCompileCommand(filename, compile_command, debug_flags):
+    local_compile_command = getRequiredCompileCommand([filename], compile_command)
 
-    block = int(round(bar_len * progress))
-    text = "Status: [{0}] {1}%".format( "="*(block-1) + ">" + " "*(bar_len-block-1), int(progress*100))
+    for flag in debug_flags:
+        local_compile_command.append("-debug=" + flag)
 
-    removeProgressBar()
+    local_compile_command.append(filename)
 
-    sys.stdout.write(text)
-    sys.stdout.flush()
+    return local_compile_command
 
 
 ####################################################################################################
 #
-#   Function to remove the progress bar.
+#   Function to get the cached result of compiling a file (without any debug flags), if there is
+#   one.
+#
+#   Params:
+#       filename = the file to be compiled
+#       compile_command = command to be used for the compilation
+#
+#   Returns:
+#       the cached return code of the compilation, None if there is no cached result
 #
 ####################################################################################################
 
-def removeProgressBar():
-    sys.stdout.write("\r")
-    sys.stdout.write("\033[K") # Clear to the end of line
-    sys.stdout.flush()
+def getCachedReturnCode(filename, compile_command):
+    if not compile_cache_directory:
+        return None
+
+    local_compile_command = getLocalCompileCommand(filename, compile_command, [])
+    cached = lookupCompileCache(getCompileCacheKey(filename, local_compile_command))
+
+    return cached[0] if cached is not None else None
 
 
 ####################################################################################################
 #
-#   Function to make a first-pass check on the given files using the given compile command.
+#   Function to find a file which fails to compile among the given files. The files are compiled
+#   together by a single run of the compiler, so that the start-up of the compiler and the parsing
+#   of commonly imported modules is paid only once. If that fails, the files are bisected to find a
+#   failing file. Single files are compiled using 'compileFile()', so their results are cached.
 #
 #   Params:
-#       files = list of all files to be compiled
+#       files = list of files to be compiled
 #       compile_command = command to be used for the compilation
+#       purpose = why the files are compiled (recorded in the trace file)
+#       failure_event = if given, an event which is set once the search can be abandoned (e.g.
+#                       because another file has already failed to compile)
 #
 #   Returns:
-#       string containing the first file that failed to compile, an empty string if all files
-#       compiled successfully
+#       a file which failed to compile, an empty string if all files compiled successfully, None if
+#       the search was abandoned
 #
 ####################################################################################################
 
-def makeFirstPassCheck(files, compile_command):
-    failed_file = ""
-    files_done = 0
-    total_files = len(files)
+def findFailingFile(files, compile_command, purpose, failure_event=None):
+    if failure_event is not None and failure_event.is_set():
+        return None
 
-    for f in files:
-        updateProgress(files_done / float(total_files))
-        return_code = compileFile(f, compile_command, [])
-        if return_code != 0:
-            failed_file = f
-            break
-        files_done += 1
+    if len(files) == 0:
+        return ""
 
-    removeProgressBar()
-    return failed_file
+    if len(files) == 1:
+        return files[0] if compileFile(files[0], compile_command, [], purpose) != 0 else ""
+
+    start_time = time.time()
+
+    with open(os.devnull, 'w') as devnull:
+        return_code = subprocess.call(getRequiredCompileCommand(files, compile_command) + files,
+                                      stdout=devnull, stderr=devnull)
+
+    traceCompile(purpose, files, [], start_time, return_code, "off")
+
+    if return_code == 0:
+        return ""
+
+    # Note that if both halves compile on their own, the failure was only caused by compiling the
+    # files together, in which case each file compiles on its own as well
+    middle = len(files) // 2
+
+    return (findFailingFile(files[:middle], compile_command, purpose, failure_event) or
+            findFailingFile(files[middle:], compile_command, purpose, failure_event))
 
 
 ####################################################################################################
 #
-#    Execution starts here! [main :)]
+#   Function to check a batch of files as part of a check of several files which stops at the first
+#   failure (e.g. the first-pass check). Files with cached results are not compiled again.
+#
+#   Params:
+#       task = tuple of the batch of files to be compiled, the command to be used for the
+#              compilation, an event which is set as soon as any file fails to compile and the
+#              purpose of the check (recorded in the trace file)
+#
+#   Returns:
+#       a tuple of the batch and the file which failed to compile (an empty string if all files
+#       compiled successfully, None if the batch was skipped because another file had already
+#       failed to compile)
 #
 ####################################################################################################
 
-parser = argparse.ArgumentParser(usage='./%(prog)s [ARGUMENTS]', description='Imports Analyser')
-parser.add_argument('-l', '--library', action='store_true', required = False,
-    default = False, help = 'Do not attempt selective imports (bug # 314)')
-args = vars(parser.parse_args())
+def checkBatchUnlessFailed(task):
+    batch, compile_command, failure_event, purpose = task
 
-cwd = os.getcwd()
+    if failure_event.is_set():
+        return (batch, None)
 
-if not os.path.isdir(cwd + "/src"):
-    print("'" + cwd + "/src' doesn't exist. Aborting.")
-    sys.exit(1)
+    files_to_compile = []
 
-files_to_skip = set()
+    for f in batch:
+        return_code = getCachedReturnCode(f, compile_command)
+        if return_code is None:
+            files_to_compile.append(f)
+        elif return_code != 0:
+            failure_event.set()
+            return (batch, f)
 
-if os.path.isfile(cwd + "/skiplist.txt"):
-    with open(cwd + "/skiplist.txt", 'r') as in_file:
-        for line in in_file:
-            line = line.strip()
+    failed_file = findFailingFile(files_to_compile, compile_command, purpose, failure_event)
+
+    if failed_file:
+        failure_event.set()
+
+    return (batch, failed_file)
+
+
+####################################################################################################
+#
+#   Function to split files into batches to be compiled together, such that there are at least as
+#   many batches as parallel jobs (where possible).
+#
+#   Params:
+#       files = list of files to be split
+#       jobs = number of parallel jobs
+#
+#   Returns:
+#       a list of batches (lists of files)
+#
+####################################################################################################
+
+def splitIntoBatches(files, jobs):
+    batch_size = max(1, min(args['batch_size'], -(-len(files) // jobs)))
+
+    return [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+
+
+####################################################################################################
+#
+#   Function to check whether an import statement is a public import.
+#
+#   Params:
+#       statement = the import statement (as parsed by 'd_lexer.parse_imports()')
+#
+#   Returns:
+#       true if the statement is a public import, false otherwise
+#
+####################################################################################################
+
+def isPublicImport(statement):
+    return any(attribute.text == 'public' for attribute in statement.attributes)
+
+
+####################################################################################################
+#
+#   Function to get the key by which duplicate imports of a module are identified, e.g. 'a.b',
+#   'c = a.b' or 'a.b : d, e'.
+#
+#   Params:
+#       module = the imported module (as parsed by 'd_lexer.parse_imports()')
+#
+#   Returns:
+#       the key of the import
+#
+####################################################################################################
+
+def getImportKey(module):
+    key = module.name
+
+    if module.alias:
+        key = module.alias + " = " + key
+
+    if module.bindings is not None:
+        key += " : " + ", ".join((b.alias + " = " + b.name) if b.alias else b.name
+                                 for b in module.bindings)
+
+    return key
+
+
+####################################################################################################
+#
+#   Function to replace the contents of a file atomically, i.e. the file either has its old or its
+#   new contents at any time (the new contents are written to a temporary file which is then renamed
+#   to the file). The permissions of the file are retained. The file is created if it doesn't exist.
+#
+#   Params:
+#       filename = the file to be replaced
+#       contents = the new contents of the file (bytes or text)
+#
+####################################################################################################
+
+def replaceFile(filename, contents):
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(filename), prefix='.')
+
+    with os.fdopen(fd, 'wb' if isinstance(contents, bytes) else 'w') as out_file:
+        out_file.write(contents)
+
+    if os.path.isfile(filename):
+        shutil.copymode(filename, tmp_file)
+    os.rename(tmp_file, filename)
+
+
+####################################################################################################
+#
+#   Function to load the data saved in a JSON file by 'saveJson()'.
+#
+#   Params:
+#       json_file = the file to load
+#       description = what the file contains (used in the message if the file is corrupt)
+#
+#   Returns:
+#       the loaded data, None if the file doesn't exist or is corrupt
+#
+####################################################################################################
+
+def loadJson(json_file, description):
+    if not os.path.isfile(json_file):
+        return None
+
+    try:
+        with open(json_file, 'r') as in_file:
+            return json.load(in_file)
+    except ValueError:
+        print(description + " '" + json_file + "' is corrupt. Will ignore.")
+        return None
+
+
+####################################################################################################
+#
+#   Function to save data in a JSON file. The file is replaced atomically (see 'replaceFile()'), so
+#   that a run which is killed while saving never leaves a corrupt file behind.
+#
+#   Params:
+#       json_file = the file to save the data in
+#       data = the data to save
+#
+####################################################################################################
+
+def saveJson(json_file, data):
+    replaceFile(json_file, json.dumps(data))
+
+
+####################################################################################################
+#
+#   Function used to search for and delete the imports of the given symbols. All imports are deleted
+#   in a single pass over the file. Public imports are never touched.
+#
+#   Params:
+#       symbols = symbols whose imports are to be deleted
+#       contents = contents of the file in which to search
+#
+#   Returns:
+#       a tuple of the new contents of the file and a list of the symbols which are not imported by
+#       the file
+#
+####################################################################################################
+
+def searchAndDeleteSymbolImports(symbols, contents):
+    symbols = set(symbols)
+    symbols_found = set()
+    spans = []
+
+    for statement in d_lexer.parse_imports(contents):
+        if isPublicImport(statement):
+            continue
+
+        removals = set()
+
+        for (symbol, index, binding_index) in gatherSymbols(statement):
+            if symbol in symbols:
+                removals.add((index, binding_index))
+                symbols_found.add(symbol)
+
+        if len(removals):
+            spans += d_lexer.import_removal_spans(contents, statement, removals)
+
+    not_found = [symbol for symbol in symbols if symbol not in symbols_found]
+
+    return (d_lexer.remove_spans(contents, spans), not_found)
+
+
+####################################################################################################
+#
+#   Function to search for and delete the duplicates of the given imports. All duplicates are
+#   deleted in a single pass over the file, the first occurrences of an import being deleted and its
+#   last occurrence being retained.
+#
+#   Params:
+#       imports_with_counts = list of [import key (as returned by 'getImportKey()'), number of
+#                             occurrences to be deleted] pairs
+#       contents = contents of the file in which to search
+#
+#   Returns:
+#       a tuple of the new contents of the file and a list of the given pairs of which no occurrence
+#       was found
+#
+####################################################################################################
+
+def searchAndDeleteDuplicateImports(imports_with_counts, contents):
+    delete_counts = dict((imp, count) for (imp, count) in imports_with_counts)
+    imports_found = set()
+    spans = []
+
+    for statement in d_lexer.parse_imports(contents):
+        removals = set()
+
+        for index, module in enumerate(statement.modules):
+            imp = getImportKey(module)
+            if delete_counts.get(imp, 0) > 0:
+                delete_counts[imp] -= 1
+                removals.add((index, None))
+                imports_found.add(imp)
+
+        if len(removals):
+            spans += d_lexer.import_removal_spans(contents, statement, removals)
+
+    not_found = [imp_with_count for imp_with_count in imports_with_counts
+                 if imp_with_count[0] not in imports_found]
+
+    return (d_lexer.remove_spans(contents, spans), not_found)
+
+
+####################################################################################################
+#
+#   Function to search for and delete the first occurrence of the given import. This function is
+#   used only when not all duplicates of an import can be deleted at once (see
+#   'searchAndDeleteDuplicateImports()').
+#
+#   Params:
+#       imp = the key of the import to be deleted (as returned by 'getImportKey()')
+#       skip_count = the number of times the given import should be skipped (i.e. retained as is and
+#                    not treated as a match)
+#       contents = contents of the file in which to search
+#
+#   Returns:
+#       the new contents of the file if an import was deleted, None otherwise
+#
+####################################################################################################
+
+def searchAndDeleteFirstImport(imp, skip_count, contents):
+    for statement in d_lexer.parse_imports(contents):
+        for index, module in enumerate(statement.modules):
+            if getImportKey(module) != imp:
+                continue
+
+            if skip_count > 0:
+                skip_count -= 1
+                continue
+
+            spans = d_lexer.import_removal_spans(contents, statement, set([(index, None)]))
+            return d_lexer.remove_spans(contents, spans)
+
+    return None
+
+
+####################################################################################################
+#
+#   Function to turn the imports of the modules corresponding to the given symbols into selective
+#   imports. Only the last module of an import statement can be imported selectively.
+#
+#   Params:
+#       selective_imports = dictionary mapping each symbol to the list of symbols to be imported
+#                           selectively from its module
+#       contents = contents of the file to be edited
+#
+#   Returns:
+#       a tuple of the new contents of the file and a list of the symbols for which no import could
+#       be made selective
+#
+####################################################################################################
+
+def searchAndMakeSelectiveImports(selective_imports, contents):
+    insertions = []
+    for statement in d_lexer.parse_imports(contents):
+        module = statement.modules[-1]
+        symbol = module.name.split('.')[-1]
+        if (not isPublicImport(statement) and module.alias is None and module.bindings is None and
+                symbol in selective_imports):
+            insertions.append((module.name_end, symbol))
+
+    for pos, symbol in reversed(insertions):
+        contents = (contents[:pos] + " : " + ", ".join(selective_imports[symbol]) +
+                    contents[pos:])
+
+    found = set(symbol for (_, symbol) in insertions)
+    not_found = [symbol for symbol in selective_imports if symbol not in found]
+
+    return (contents, not_found)
+
+
+####################################################################################################
+#
+#   Function to find the imports which can be made selective without building the file, using the
+#   export index. An import is a candidate if it is not public, it's the last module of its
+#   statement (see 'searchAndMakeSelectiveImports()') and the file uses symbols which the module
+#   exports but which aren't visible otherwise, i.e. declared by the file itself or exported by
+#   another of its imports.
+#
+#   Params:
+#       statements = the import statements of the file (as parsed by 'd_lexer.parse_imports()')
+#       used_symbols = set of the symbols used by the file
+#       declared_symbols = set of the symbols declared by the file at module scope
+#       symbols = set of the symbols whose imports may be made selective
+#
+#   Returns:
+#       a dictionary mapping each symbol of the imports to be made selective to the sorted list of
+#       symbols to be imported selectively from its module
+#
+####################################################################################################
+
+def getSelectiveImports(statements, used_symbols, declared_symbols, symbols):
+    visible_symbols = set(declared_symbols)
+    candidates = {}
+    excluded = set()
+
+    for statement in statements:
+        for index, module in enumerate(statement.modules):
+            symbol = module.name.split('.')[-1]
+            if module.bindings is not None:
+                visible_symbols.update(binding.alias or binding.name for binding in module.bindings)
+            elif module.alias is not None:
+                visible_symbols.add(module.alias)
+            elif symbol not in symbols:
+                visible_symbols |= getModuleExports(module.name)
+            elif (isPublicImport(statement) or index != len(statement.modules) - 1 or
+                    candidates.get(symbol, module.name) != module.name):
+                # Leave it to the build to find out whether it can be made selective
+                excluded.add(symbol)
+                visible_symbols |= getModuleExports(module.name)
+            else:
+                candidates[symbol] = module.name
+
+    selective_imports = {}
+
+    for symbol, module in candidates.items():
+        if symbol in excluded:
+            continue
+
+        symbols_to_import = used_symbols & getModuleExports(module)
+        symbols_to_import -= visible_symbols
+        for other_symbol, other_module in candidates.items():
+            if other_symbol != symbol:
+                symbols_to_import -= getModuleExports(other_module)
+
+        if len(symbols_to_import):
+            selective_imports[symbol] = sorted(symbols_to_import)
+
+    return selective_imports
+
+
+####################################################################################################
+#
+#   Function that attempts to automatically perform selective imports. It is called when it is known
+#   that an import is not used within the file, but removing it causes a build failure. The symbols
+#   to be selectively imported are gathered from the stderr output of the failed build. (This is
+#   the fallback for the imports which couldn't be made selective using the export index.)
+#
+#   Params:
+#       contents = contents of the file being analysed (its most recent accepted state)
+#       symbol = symbol from which selective imports are to be attempted
+#       check_contents = function which writes the given contents to the file and checks it,
+#                        returning None if the contents can be accepted
+#       tmp_directory = directory containing the stderr output of the failed build
+#
+#   Returns:
+#       the new contents of the file if the attempt to perform selective imports was successful,
+#       None otherwise
+#
+####################################################################################################
+
+def attemptSelectiveImports(contents, symbol, check_contents, tmp_directory):
+    symbols_to_import = set()
+
+    with open(tmp_directory + "/stderr.txt", 'r') as in_file:
+        # Example error:
+        #     File.d(3): Error: undefined identifier ID, did you mean function myID?
+        matcher_with_suggestion = r'.*Error: undefined identifier (.*), did you mean .*'
+
+        # Example error:
+        #     File.d(3): Error: undefined identifier ID
+        matcher_without_suggestion = r'.*Error: undefined identifier (.*)'
+
+        for line in in_file:
+            # Note that you must apply 'matcher_with_suggestion' first, because
+            # 'matcher_without_suggestion' will match all with_suggestion cases as well
+            m1 = re.search(matcher_with_suggestion, line)
+            if m1:
+                symbols_to_import.add(m1.group(1))
+            else:
+                m2 = re.search(matcher_without_suggestion, line)
+                if m2:
+                    symbols_to_import.add(m2.group(1))
+
+    new_contents, not_found = searchAndMakeSelectiveImports({symbol: sorted(symbols_to_import)},
+                                                            contents)
+
+    if len(not_found) != 0 or check_contents(new_contents) is not None:
+        # The selective imports didn't do the trick (the accepted contents stay as they are)
+        return None
+
+    return new_contents
+
+
+####################################################################################################
+#
+#   Function to remove as many of the given candidates (e.g. unused imports) from a file as
+#   possible, using as few compilations as possible. All candidates are removed at once and the
+#   change is checked. If the check fails, the candidates are split into two halves which are tried
+#   in turn (recursively). This way, the k candidates which must stay are found among n candidates
+#   using O(k log n) checks instead of n.
+#
+#   The file is edited in memory: the candidates are removed from the most recent accepted state of
+#   its contents, and reverting merely means going back to that state. The file itself is written
+#   only when a change is to be checked.
+#
+#   Params:
+#       candidates = list of candidates to be removed
+#       contents = the most recent accepted state of the contents of the file
+#       remove_candidates = function which removes a list of candidates from the given contents,
+#                           returning a tuple of the new contents and a list of the candidates
+#                           which were not found
+#       check_removal = function which writes the given contents to the file and checks it,
+#                       returning None if the removals can be accepted and the reason for failure
+#                       otherwise
+#       handle_failure = function called with a candidate which cannot be removed on its own, the
+#                        reason for failure and the accepted contents, returning the (possibly
+#                        changed) accepted contents
+#
+#   Returns:
+#       a tuple of the new accepted state of the contents and a list of the candidates which were
+#       not found in the file
+#
+####################################################################################################
+
+def removeInBatches(candidates, contents, remove_candidates, check_removal, handle_failure):
+    new_contents, not_found = remove_candidates(candidates, contents)
+
+    if len(not_found) == len(candidates):
+        return (contents, not_found)
+
+    reason = check_removal(new_contents)
+
+    if reason is None:
+        return (new_contents, not_found)
+
+    if len(candidates) == 1:
+        return (handle_failure(candidates[0], reason, contents), [])
+
+    middle = len(candidates) // 2
+
+    contents, not_found_first = removeInBatches(candidates[:middle], contents, remove_candidates,
+                                                check_removal, handle_failure)
+    contents, not_found_second = removeInBatches(candidates[middle:], contents, remove_candidates,
+                                                 check_removal, handle_failure)
+
+    return (contents, not_found_first + not_found_second)
+
+
+####################################################################################################
+#
+#   Function to gather all symbols of interest in the given import statement, i.e. the selectively
+#   imported symbols, the names of renamed imports and the last component of the names of all other
+#   imported modules.
+#
+#   Params:
+#       statement = the import statement (as parsed by 'd_lexer.parse_imports()')
+#
+#   Returns:
+#       a list of (symbol, module index, symbol index) tuples for all the gathered symbols, where the
+#       symbol index is the index of a selectively imported symbol within the module's symbols (None
+#       if the symbol stands for the whole module)
+#
+####################################################################################################
+
+def gatherSymbols(statement):
+    symbols = []
+
+    for index, module in enumerate(statement.modules):
+        if module.bindings is not None:
+            # Selective import statement, gather all symbols after the colon
+            for binding_index, binding in enumerate(module.bindings):
+                symbols.append((binding.alias or binding.name, index, binding_index))
+        elif module.alias is not None:
+            # Named import statement, gather the symbol before the equals sign
+            symbols.append((module.alias, index, None))
+        else:
+            # Regular import statement, gather a single symbol, i.e. the module name
+            symbols.append((module.name.split('.')[-1], index, None))
+
+    return symbols
+
+
+####################################################################################################
+#
+#   Function to analyse a file to determine which imports may not be necessary.
+#   It also acts upon the determined suggestions and makes changes to the file as necessary (the
+#   file is compiled after every edit and if the compilation fails, it is rolled back to its most
+#   recent compilable state).
+#
+#   Params:
+#       file_orig = the file to be analysed
+#       compile_command = the command to be used for compiling the file
+#       tmp_directory = directory in which to create temporary files whenever needed
+#
+#   Returns:
+#       a set containing all errors
+#       (if the set is not made up of a single element pointing to an outright compilation error,
+#       then it should be thought of as a set of suggestions which could not be automatically
+#       applied)
+#
+####################################################################################################
+
+def analyseFile(file_orig, compile_command, tmp_directory):
+
+    errors = set()
+
+    return_code = compileFile(file_orig, compile_command, [], "baseline")
+
+    if return_code != 0:
+        # If compilation fails at this stage, it means that some modification made to another file
+        # previously has caused a problem in this file. This is reason enough to abort and call for
+        # manual intervention.
+        errors.add("BUILD FAILURE")
+        return errors
+
+    imports = []
+    imported_symbols = []
+    debug_flags = set()
+
+    # The file is edited in memory, 'contents' always being its most recent accepted state. The file
+    # itself is written only when the compiler must see a change (reverting a change which failed to
+    # build doesn't need a write, the next change to be built overwrites it anyway).
+    with open(file_orig, 'r') as in_file:
+        contents = in_file.read()
+
+    # The contents last written to the file (a list, so that the nested functions can update it)
+    written_contents = [contents]
+
+    def writeContents(new_contents):
+        if new_contents != written_contents[0]:
+            replaceFile(file_orig, new_contents)
+            written_contents[0] = new_contents
+
+    tokens = d_lexer.tokenize(contents)
+    statements = d_lexer.parse_imports(contents, tokens)
+    private_spans = []
+
+    for statement in statements:
+        for attribute in statement.attributes:
+            if attribute.text == "private":
+                # It's a 'private import' - the 'private' keyword is redundant, so remove it (along
+                # with the whitespace following it).
+                end = re.compile(r'\s*').match(contents, attribute.end).end()
+                private_spans.append((attribute.start, end))
+
+        for module in statement.modules:
+            imports.append(getImportKey(module))
+
+        # Don't gather symbols from public imports, so that public imports are never touched
+        if not isPublicImport(statement):
+            imported_symbols += [symbol for (symbol, _, _) in gatherSymbols(statement)]
+
+    # An imported symbol is used if it appears as an identifier anywhere outside the import
+    # statements (comments and strings don't count)
+    code = d_lexer.code_tokens(tokens)
+    statement_spans = [(st.start, st.end) for st in statements]
+    identifiers = d_lexer.identifier_set(code, statement_spans)
+    symbols_seen = set(imported_symbols) & identifiers
+
+    # Members (e.g. 'x' in 'a.x') are never imported, and the names the file declares itself (e.g.
+    # local variables, parameters and fields) hide the imported ones, so neither count as uses of
+    # the symbols exported by the imported modules
+    used_symbols = (d_lexer.identifier_set(code, statement_spans, members=False) -
+                    d_lexer.declared_identifiers(code))
+    declared_symbols = d_lexer.parse_declarations(contents, tokens)
+
+    for i in range(len(code) - 3):
+        # Get the word in the parentheses after debug
+        if (code[i].text == "debug" and code[i + 1].text == "(" and code[i + 3].text == ")"):
+            debug_flags.add(code[i + 2].text)
+
+    private_removed_contents = d_lexer.remove_spans(contents, private_spans)
+    writeContents(private_removed_contents)
+
+    return_code = compileFile(file_orig, compile_command, debug_flags, "private removal")
+
+    if return_code == 0:
+        contents = private_removed_contents
+
+    import_counts = {}
+
+    for imp in imports:
+        import_counts[imp] = import_counts.get(imp, 0) + 1
+
+    # All but the last occurrence of each duplicated import are to be deleted
+    imports_to_delete = [[imp, occurrence_count - 1]
+                         for (imp, occurrence_count) in sorted(import_counts.items())
+                         if occurrence_count > 1]
+
+    def checkRemoval(new_contents, purpose):
+        writeContents(new_contents)
+        if compileFile(file_orig, compile_command, debug_flags, purpose, tmp_directory) != 0:
+            return "compile"
+        if not importersCompile(file_orig, compile_command):
+            return "importers"
+        return None
+
+    def handleDuplicatesFailure(imp_with_count, reason, contents):
+        # Not all duplicates of this import can be removed, so try removing them one at a time
+        del_count = 0
+        num_fail = 0
+
+        while del_count < imp_with_count[1]:
+            new_contents = searchAndDeleteFirstImport(imp_with_count[0], num_fail, contents)
+
+            if new_contents is None:
+                # No more occurrences to be tried
+                break
+
+            if checkRemoval(new_contents, "duplicate removal") is not None:
+                num_fail += 1
+            else:
+                contents = new_contents
+
+            del_count += 1
+
+        if num_fail != 0:
+            errors.add("    * '" + imp_with_count[0] + "' appears " + str(num_fail + 1) + " times")
+
+        return contents
+
+    if len(imports_to_delete):
+        contents, _ = removeInBatches(imports_to_delete, contents, searchAndDeleteDuplicateImports,
+                                      lambda c: checkRemoval(c, "duplicate removal"),
+                                      handleDuplicatesFailure)
+
+    # For some symbols, we never attempt to perform selective imports. However, we still see if the
+    # whole import line can be removed.
+    # The corresponding import statements are:
+    #     import krill.channels.Channels;
+    #     import ocean.util.serialize.contiguous.MultiVersionDecorator;
+    #     import ocean.io.Stdout;
+    #     import ocean.transition;
+    #     import ocean.core.Test;
+    non_selective_import_symbols = ['Channels', 'MultiVersionDecorator', 'Stdout', 'transition',
+        'Test']
+
+    symbols_not_seen = set(imported_symbols) - symbols_seen
+
+    if len(symbols_not_seen) and not args['library']:
+        # Imports which are known from the export index to provide symbols used by the file can't be
+        # removed, so try making them selective straight away
+        selectable_symbols = symbols_not_seen - set(non_selective_import_symbols)
+        selective_imports = getSelectiveImports(statements, used_symbols, declared_symbols,
+                                                selectable_symbols)
+        made_selective = set(selective_imports)
+
+        def makeSelective(symbols, contents):
+            return searchAndMakeSelectiveImports(dict((symbol, selective_imports[symbol])
+                                                      for symbol in symbols), contents)
+
+        def handleSelectiveFailure(symbol, reason, contents):
+            # The index was wrong (or the importers need more than the file itself), so leave it to
+            # the removal of the import below
+            made_selective.discard(symbol)
+            return contents
+
+        def checkSelective(new_contents):
+            return checkRemoval(new_contents, "selective import")
+
+        contents, not_made_selective = removeInBatches(sorted(selective_imports), contents,
+                                                       makeSelective, checkSelective,
+                                                       handleSelectiveFailure)
+        made_selective -= set(not_made_selective)
+        symbols_not_seen -= made_selective
+
+        # The index only tells which symbols may come from each module, so remove the ones which
+        # aren't needed after all. A single binding is left alone (removing it would mean that the
+        # file, which uses the symbol, doesn't need the import at all), and so are the names already
+        # imported by the file (removing them would remove their imports as well).
+        bindings = sorted(binding for symbol in made_selective
+                          if len(selective_imports[symbol]) > 1
+                          for binding in selective_imports[symbol]
+                          if binding not in imported_symbols)
+
+        if len(bindings):
+            contents, _ = removeInBatches(bindings, contents, searchAndDeleteSymbolImports,
+                                          lambda c: checkRemoval(c, "binding removal"),
+                                          lambda binding, reason, contents: contents)
+
+    if (len(symbols_not_seen)):
+        symbol_del_fail = set()
+        symbol_needed_by_importers = set()
+
+        def handleSymbolFailure(symbol, reason, contents):
+            if reason == "importers":
+                # The file itself compiles without the import, but a module importing the file
+                # doesn't (it relies on the import leaking through)
+                symbol_needed_by_importers.add(symbol)
+            elif symbol in non_selective_import_symbols:
+                # Do nothing
+                pass
+            elif args['library']:
+                symbol_del_fail.add(symbol)
+            else:
+                selective_contents = attemptSelectiveImports(
+                    contents, symbol, lambda c: checkRemoval(c, "selective import"), tmp_directory)
+                if selective_contents is not None:
+                    return selective_contents
+                symbol_del_fail.add(symbol)
+
+            return contents
+
+        contents, symbols_not_found = removeInBatches(list(symbols_not_seen), contents,
+                                                      searchAndDeleteSymbolImports,
+                                                      lambda c: checkRemoval(c, "symbol removal"),
+                                                      handleSymbolFailure)
+        symbol_del_fail.update(symbols_not_found)
+
+        if len(symbol_del_fail):
+            for symbol in symbol_del_fail:
+                errors.add("    * '" + symbol + "' imported but unused (selective imports possible?)")
+
+        for symbol in symbol_needed_by_importers:
+            errors.add("    * '" + symbol + "' imported but unused (needed by importing modules)")
+
+    # Leave the file in its accepted state
+    writeContents(contents)
+
+    return errors
+
+
+####################################################################################################
+#
+#   Function to parse the module declaration and the imported modules of a D file.
+#
+#   Params:
+#       filename = the file to be parsed
+#       default_module = module name to use if the file has no module declaration
+#
+#   Returns:
+#       a tuple of the module name and a sorted list of the imported modules
+#
+####################################################################################################
+
+def parseModuleImports(filename, default_module):
+    with open(filename, 'r') as in_file:
+        contents = in_file.read()
+
+    tokens = d_lexer.tokenize(contents)
+
+    module = d_lexer.parse_module_name(contents, tokens) or default_module
+
+    imported_modules = set()
+
+    for statement in d_lexer.parse_imports(contents, tokens):
+        for imported_module in statement.modules:
+            imported_modules.add(imported_module.name)
+
+    return (module, sorted(imported_modules))
+
+
+####################################################################################################
+#
+#   Function to build the graph of imports between all D files in the given include directories.
+#   The graph is loaded from the given file if it exists, and only the files which have changed
+#   since it was saved are parsed again.
+#
+#   Params:
+#       include_dirs = list of include directories
+#       graph_file = file in which the graph is saved across runs
+#
+#   Returns:
+#       a dictionary mapping each file to a dictionary containing its stat signature, its module
+#       name and the modules it imports
+#
+####################################################################################################
+
+def loadImportGraph(include_dirs, graph_file):
+    saved_graph = loadJson(graph_file, "Import graph") or {}
+
+    graph = {}
+
+    for include_dir in include_dirs:
+        for root, subdirs, filenames in os.walk(include_dir):
+            for filename in filenames:
+                if not (filename.endswith(".d") or filename.endswith(".di")):
+                    continue
+
+                full_file_path = os.path.abspath(os.path.join(root, filename))
+                if full_file_path in graph:
+                    continue
+
+                st = os.stat(full_file_path)
+                signature = [st.st_size, st.st_mtime]
+
+                entry = saved_graph.get(full_file_path)
+                if entry is None or entry['signature'] != signature:
+                    default_module = os.path.splitext(os.path.relpath(full_file_path,
+                        include_dir))[0].replace(os.sep, '.')
+                    module, imported_modules = parseModuleImports(full_file_path, default_module)
+                    entry = {'signature': signature, 'module': module, 'imports': imported_modules}
+
+                graph[full_file_path] = entry
+
+    return graph
+
+
+####################################################################################################
+#
+#   Function to get the reverse of the import graph, i.e. the files importing each module.
+#
+#   Params:
+#       graph = the import graph
+#
+#   Returns:
+#       a dictionary mapping each imported module to the set of files importing it
+#
+####################################################################################################
+
+def getModuleImporters(graph):
+    module_importers = {}
+
+    for f, entry in graph.items():
+        for imported_module in entry['imports']:
+            module_importers.setdefault(imported_module, set()).add(f)
+
+    return module_importers
+
+
+####################################################################################################
+#
+#   Function to parse a file again after it was modified (or created, or deleted), and update the
+#   import graph (and its reverse) accordingly.
+#
+#   Params:
+#       graph = the import graph
+#       module_importers = the reverse of the import graph
+#       filename = the modified file
+#
+####################################################################################################
+
+def updateImportGraph(graph, module_importers, filename):
+    filename = os.path.abspath(filename)
+
+    entry = graph.get(filename)
+    if entry is not None:
+        default_module = entry['module']
+
+        for imported_module in entry['imports']:
+            module_importers[imported_module].discard(filename)
+    else:
+        for include_dir in include_dirs:
+            include_dir = os.path.abspath(include_dir)
+            if filename.startswith(include_dir + os.sep):
+                break
+        else:
+            # The file is not within the include directories
+            return
+
+        default_module = os.path.splitext(os.path.relpath(filename,
+            include_dir))[0].replace(os.sep, '.')
+
+    # The include directories needed by the file (and by the files importing it) may change
+    required_include_dirs_cache.clear()
+
+    if not os.path.isfile(filename):
+        graph.pop(filename, None)
+        return
+
+    st = os.stat(filename)
+    module, imported_modules = parseModuleImports(filename, default_module)
+    graph[filename] = {'signature': [st.st_size, st.st_mtime], 'module': module,
+                       'imports': imported_modules}
+
+    for imported_module in imported_modules:
+        module_importers.setdefault(imported_module, set()).add(filename)
+
+
+####################################################################################################
+#
+#   Function to get the files importing the given file. Only files which can be analysed (i.e. D
+#   files in src/ which are not skipped) are considered.
+#
+#   Params:
+#       filename = the imported file
+#
+#   Returns:
+#       a sorted list of the importing files
+#
+####################################################################################################
+
+def getImporters(filename):
+    entry = import_graph.get(os.path.abspath(filename))
+    if entry is None:
+        return []
+
+    importers = module_importers.get(entry['module'], set())
+
+    return sorted(f for f in importers if f in analysable_files)
+
+
+####################################################################################################
+#
+#   Function to find the file of a module the way the compiler does, i.e. in the first include
+#   directory containing it, preferring interface files over source files.
+#
+#   Params:
+#       module = the module to find
+#       include_dirs = list of include directories (in the order in which they are searched)
+#
+#   Returns:
+#       the path of the module's file, None if it couldn't be found
+#
+####################################################################################################
+
+def getModuleFile(module, include_dirs):
+    relative_path = module.replace('.', '/')
+
+    for include_dir in include_dirs:
+        for extension in (".di", ".d"):
+            module_file = os.path.abspath(os.path.join(include_dir, relative_path + extension))
+            if os.path.isfile(module_file):
+                return module_file
+
+    return None
+
+
+# Version of the entries of the export index, to be incremented whenever the way the files are
+# parsed changes (so that the entries saved by earlier versions are parsed again)
+export_index_version = 2
+
+
+####################################################################################################
+#
+#   Function to parse the symbols a D file exports, i.e. the symbols it declares at module scope
+#   which other modules can see (not 'private' or 'package' ones), and the modules it imports
+#   publicly.
+#
+#   Params:
+#       filename = the file to be parsed
+#
+#   Returns:
+#       an entry of the export index (see 'loadExportIndex()')
+#
+####################################################################################################
+
+def parseModuleExports(filename):
+    with open(filename, 'r') as in_file:
+        contents = in_file.read()
+
+    tokens = d_lexer.tokenize(contents)
+
+    public_imports = set()
+
+    for statement in d_lexer.parse_imports(contents, tokens):
+        if isPublicImport(statement):
+            for module in statement.modules:
+                if module.alias is None and module.bindings is None:
+                    public_imports.add(module.name)
+
+    declarations = d_lexer.parse_declarations(contents, tokens, public_only=True)
+
+    return {'version': export_index_version, 'hash': getFileHash(filename),
+            'declarations': sorted(declarations), 'public_imports': sorted(public_imports)}
+
+
+####################################################################################################
+#
+#   Function to build the index of the symbols exported by all D files in the given include
+#   directories. The index is loaded from the given file if it exists, and only the files whose
+#   contents have changed since it was saved are parsed again.
+#
+#   Params:
+#       include_dirs = list of include directories
+#       index_file = file in which the index is saved across runs
+#
+#   Returns:
+#       a dictionary mapping each file to a dictionary containing the version of the index it was
+#       parsed for, the hash of its contents, the symbols it exports and the modules it imports
+#       publicly
+#
+####################################################################################################
+
+def loadExportIndex(include_dirs, index_file):
+    saved_index = loadJson(index_file, "Export index") or {}
+
+    index = {}
+
+    for include_file in getIncludeFiles(include_dirs):
+        entry = saved_index.get(include_file)
+        if (entry is None or entry.get('version') != export_index_version or
+                entry['hash'] != getFileHash(include_file)):
+            entry = parseModuleExports(include_file)
+
+        index[include_file] = entry
+
+    return index
+
+
+####################################################################################################
+#
+#   Function to parse a file again after it was modified (or created, or deleted), and update the
+#   export index accordingly.
+#
+#   Params:
+#       index = the export index
+#       filename = the modified file
+#
+####################################################################################################
+
+def updateExportIndex(index, filename):
+    filename = os.path.abspath(filename)
+
+    if not os.path.isfile(filename):
+        index.pop(filename, None)
+        return
+
+    index[filename] = parseModuleExports(filename)
+
+    # The exports of any module may depend on the file through public imports
+    module_exports.clear()
+
+
+####################################################################################################
+#
+#   Function to get the symbols which importing a module makes visible, i.e. the symbols the module
+#   declares plus those of the modules it imports publicly. The result is remembered, as the
+#   analysis never changes declarations or public imports.
+#
+#   Params:
+#       module = the imported module
+#
+#   Returns:
+#       a set of the visible symbols (empty if the module is not in the export index)
+#
+####################################################################################################
+
+def getModuleExports(module):
+    if module in module_exports:
+        return module_exports[module]
+
+    # Guard against cycles of public imports
+    module_exports[module] = set()
+
+    exports = set()
+
+    entry = export_index.get(getModuleFile(module, include_dirs))
+    if entry is not None:
+        exports.update(entry['declarations'])
+        for public_import in entry['public_imports']:
+            exports |= getModuleExports(public_import)
+
+    module_exports[module] = exports
+    return exports
+
+
+####################################################################################################
+#
+#   Function to get the table resolving modules to files, the way the compiler does (see
+#   'getModuleFile()'). The result is remembered, as the set of files does not change during a run.
+#
+#   Params:
+#       include_dirs = list of include directories (in the order in which they are searched)
+#
+#   Returns:
+#       a dictionary mapping the relative path of each module (without the extension, e.g. 'a/b/c'
+#       for module 'a.b.c') to a tuple of the index of the include directory containing it and the
+#       path of its file
+#
+####################################################################################################
+
+def getModuleDirectories(include_dirs):
+    key = tuple(include_dirs)
+
+    if key not in module_directories_cache:
+        module_directories = {}
+
+        for index, include_dir in enumerate(include_dirs):
+            for root, subdirs, filenames in os.walk(include_dir):
+                for filename in filenames:
+                    if not (filename.endswith(".d") or filename.endswith(".di")):
+                        continue
+
+                    module_file = os.path.abspath(os.path.join(root, filename))
+                    module_path = os.path.splitext(os.path.relpath(module_file,
+                        include_dir))[0].replace(os.sep, '/')
+
+                    found = module_directories.get(module_path)
+                    if found is None or (found[0] == index and filename.endswith(".di")):
+                        module_directories[module_path] = (index, module_file)
+
+        module_directories_cache[key] = module_directories
+
+    return module_directories_cache[key]
+
+
+####################################################################################################
+#
+#   Function to get the include directories needed to compile a file, i.e. the directories in which
+#   the compiler finds the modules the file imports, directly or indirectly. The imports are taken
+#   from the import graph, so the result covers the file as it was last parsed (the analysis only
+#   ever removes imports, so that's enough for the edited versions of the file as well).
+#
+#   Params:
+#       filename = the file to be compiled
+#       command_include_dirs = list of include directories of the compilation command
+#
+#   Returns:
+#       a set of the indexes of the needed include directories, None if they can't be determined
+#       (i.e. the file or a module it imports is not in the import graph)
+#
+####################################################################################################
+
+def getRequiredIncludeDirs(filename, command_include_dirs):
+    key = (filename, tuple(command_include_dirs))
+
+    if key in required_include_dirs_cache:
+        return required_include_dirs_cache[key]
+
+    required_include_dirs = None
+
+    entry = import_graph.get(filename)
+
+    if entry is not None:
+        command_modules = getModuleDirectories(command_include_dirs)
+        project_modules = getModuleDirectories(include_dirs)
+
+        required_include_dirs = set()
+
+        # The 'object' module is imported implicitly
+        pending_modules = ['object'] + entry['imports']
+        seen_modules = set()
+
+        while pending_modules:
+            module = pending_modules.pop()
+            if module in seen_modules:
+                continue
+            seen_modules.add(module)
+
+            module_path = module.replace('.', '/')
+
+            found = command_modules.get(module_path)
+            if found is None:
+                # The module is found through the compiler's own configuration (or not at all)
+                continue
+
+            required_include_dirs.add(found[0])
+
+            # The imports are taken from the project's files even if the compiler finds an interface
+            # file, as interface files keep the imports of the files they were generated from
+            entry = import_graph.get(project_modules.get(module_path, (None, None))[1])
+            if entry is None:
+                required_include_dirs = None
+                break
+
+            pending_modules.extend(entry['imports'])
+
+    required_include_dirs_cache[key] = required_include_dirs
+    return required_include_dirs
+
+
+####################################################################################################
+#
+#   Function to reduce the include directories of a compilation command to those needed to compile
+#   the given files (see 'getRequiredIncludeDirs()'), so that the compiler doesn't look for every
+#   imported module in every include directory. The order of the include directories is kept, so
+#   the compiler finds exactly the same files as with the full command.
+#
+#   Params:
+#       files = list of the files to be compiled
+#       compile_command = command to be used for the compilation
+#
+#   Returns:
+#       the reduced command, the given command if the needed include directories can't be
+#       determined
+#
+####################################################################################################
+
+def getRequiredCompileCommand(files, compile_command):
+    # The include directories may be those of a workspace
+    command_include_dirs = [getRealPath(arg[2:]) for arg in compile_command if arg.startswith("-I")]
+
+    required_include_dirs = set()
+
+    for f in files:
+        file_include_dirs = getRequiredIncludeDirs(os.path.abspath(getRealPath(f)),
+                                                   command_include_dirs)
+        if file_include_dirs is None:
+            return compile_command
+
+        required_include_dirs |= file_include_dirs
+
+    required_compile_command = []
+    index = 0
+
+    for arg in compile_command:
+        if arg.startswith("-I"):
+            if index in required_include_dirs:
+                required_compile_command.append(arg)
+            index += 1
+        else:
+            required_compile_command.append(arg)
+
+    return required_compile_command
+
+
+####################################################################################################
+#
+#   Function to get the D source files for which interface files can be generated, i.e. the files of
+#   all modules imported anywhere in the project.
+#
+#   Params:
+#       module_importers = the reverse of the import graph
+#       include_dirs = list of include directories (in the order in which they are searched)
+#
+#   Returns:
+#       a dictionary mapping each source file to its module
+#
+####################################################################################################
+
+def getInterfaceSources(module_importers, include_dirs):
+    sources = {}
+
+    for module in module_importers:
+        module_file = getModuleFile(module, include_dirs)
+        if module_file is not None and module_file.endswith(".d"):
+            sources[module_file] = module
+
+    return sources
+
+
+####################################################################################################
+#
+#   Function to generate the interface file of a single module, unless an interface file generated
+#   from the same contents already exists.
+#
+#   Params:
+#       source_file = the D source file of the module
+#
+#   Returns:
+#       a tuple of the source file and the content hash from which its interface file was generated
+#       (None if the interface file couldn't be generated)
+#
+####################################################################################################
+
+def generateInterfaceFile(source_file):
+    module = interface_sources[source_file]
+    interface_file = os.path.join(interface_files_directory, module.replace('.', '/') + ".di")
+
+    source_hash = getFileHash(source_file)
+    if interface_files_manifest.get(source_file) == source_hash and os.path.isfile(interface_file):
+        return (source_file, source_hash)
+
+    if not os.path.isdir(os.path.dirname(interface_file)):
+        try:
+            os.makedirs(os.path.dirname(interface_file))
+        except OSError:
+            # Another thread or process may have created it in the meantime
+            pass
+
+    if not writeInterfaceFile(interface_compile_command, source_file, interface_file):
+        return (source_file, None)
+
+    return (source_file, source_hash)
+
+
+####################################################################################################
+#
+#   Function to run the compiler to write the interface file of a module.
+#
+#   Params:
+#       command = command to be used for the compilation
+#       source_file = the D source file of the module
+#       interface_file = the interface file to be written
+#
+#   Returns:
+#       true if the interface file was written, false otherwise (in which case any old interface
+#       file is removed)
+#
+####################################################################################################
+
+def writeInterfaceFile(command, source_file, interface_file):
+    # Generate to a temporary file first and then rename it, so that concurrent compilations never
+    # see a partially written interface file
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(interface_file), prefix='.', suffix='.di')
+    os.close(fd)
+
+    start_time = time.time()
+
+    with open(os.devnull, 'w') as devnull:
+        return_code = subprocess.call(getRequiredCompileCommand([source_file], command) +
+            ["-H", "-Hf" + tmp_file, source_file], stdout=devnull, stderr=devnull)
+
+    traceCompile("interface generation", [source_file], [], start_time, return_code, "off")
+
+    if return_code != 0:
+        # Without an interface file, the compiler simply falls back to the source file
+        os.remove(tmp_file)
+        if os.path.lexists(interface_file):
+            os.remove(interface_file)
+        return False
+
+    os.rename(tmp_file, interface_file)
+    return True
+
+
+####################################################################################################
+#
+#   Function to bring the interface files of the given source files up to date.
+#
+#   Params:
+#       source_files = list of source files whose interface files should be updated
+#       jobs = number of interface files to generate in parallel
+#
+####################################################################################################
+
+def updateInterfaceFiles(source_files, jobs):
+    source_files = [f for f in source_files if f in interface_sources]
+    if not source_files:
+        return
+
+    if len(source_files) == 1:
+        results = [generateInterfaceFile(source_files[0])]
+    else:
+        pool = multiprocessing.pool.ThreadPool(jobs)
+        try:
+            results = list(waitForResults(pool.imap_unordered(generateInterfaceFile,
+                                                              source_files)))
+        finally:
+            pool.terminate()
+            pool.join()
+
+    for source_file, source_hash in results:
+        if source_hash is None:
+            interface_files_manifest.pop(source_file, None)
+        else:
+            interface_files_manifest[source_file] = source_hash
+
+
+####################################################################################################
+#
+#   Function to load the content hashes of the files analysed in previous runs.
+#
+#   Params:
+#       state_file = file in which the hashes are saved
+#
+#   Returns:
+#       a dictionary mapping each analysed file to its content hash after the analysis
+#
+####################################################################################################
+
+def loadAnalysedFiles(state_file):
+    return loadJson(state_file, "State file") or {}
+
+
+####################################################################################################
+#
+#   Function to save the content hashes of the analysed files. Entries of files analysed in earlier
+#   runs are retained as long as the files haven't changed since.
+#
+#   Params:
+#       state_file = file in which to save the hashes
+#       analysed_files = list of files analysed in this run
+#
+####################################################################################################
+
+def saveAnalysedFiles(state_file, analysed_files):
+    state = {}
+
+    for f, file_hash in loadAnalysedFiles(state_file).items():
+        if getFileHash(f) == file_hash:
+            state[f] = file_hash
+
+    for f in analysed_files:
+        state[os.path.abspath(f)] = getFileHash(f)
+
+    saveJson(state_file, state)
+
+
+####################################################################################################
+#
+#   Function to get the files which have changed since the given git reference.
+#
+#   Params:
+#       ref = the git reference to compare with
+#       files = list of all files which can be analysed
+#
+#   Returns:
+#       the set of changed files
+#
+####################################################################################################
+
+def getFilesChangedSince(ref, files):
+    git_top = git.in_repo()
+
+    changed_files = set(os.path.abspath(os.path.join(git_top, f))
+                        for f in git.get_changed_files(ref))
+
+    return set(f for f in files if os.path.abspath(f) in changed_files)
+
+
+####################################################################################################
+#
+#   Function to get the files which have changed since they were last analysed.
+#
+#   Params:
+#       state_file = file in which the hashes of the analysed files are saved
+#       files = list of all files which can be analysed
+#
+#   Returns:
+#       the set of changed files
+#
+####################################################################################################
+
+def getFilesChangedSinceLastRun(state_file, files):
+    analysed_files = loadAnalysedFiles(state_file)
+
+    return set(f for f in files if analysed_files.get(os.path.abspath(f)) != getFileHash(f))
+
+
+####################################################################################################
+#
+#   Function to load the journal of an interrupted run.
+#
+#   Params:
+#       journal_file = file in which the journal is kept
+#
+#   Returns:
+#       a list of the journal entries (see 'writeJournalEntry()' and 'writeJournalSnapshot()'), in
+#       the order in which they were written
+#
+####################################################################################################
+
+def loadJournal(journal_file):
+    entries = []
+
+    if not os.path.isfile(journal_file):
+        return entries
+
+    with open(journal_file, 'r') as in_file:
+        for line in in_file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # The run may have been killed while writing the entry
+                pass
+
+    return entries
+
+
+####################################################################################################
+#
+#   Function to record in the journal that a file has been analysed (and its changes applied), so
+#   that an interrupted run can be resumed from where it stopped. Along with the result of the
+#   analysis, the entry records the hash of the file, to tell whether it has changed since.
+#
+#   Params:
+#       journal = the open journal file
+#       f = the analysed file
+#       errors = set of the errors found in the file
+#       modified = whether the file was modified
+#
+####################################################################################################
+
+def writeJournalEntry(journal, f, errors, modified):
+    entry = {'file': f, 'hash': getFileHash(f), 'modified': modified, 'errors': sorted(errors)}
+
+    journal.write(json.dumps(entry) + '\n')
+    journal.flush()
+
+
+####################################################################################################
+#
+#   Function to record in the journal the hashes of all D files in the include directories at a
+#   time when all files are known to compile (i.e. after the first-pass check). Together with the
+#   hashes recorded by the entries of the files analysed after it, the snapshot tells which files
+#   have changed since (see 'getFilesToCheckOnResume()').
+#
+#   Params:
+#       journal = the open journal file
+#
+####################################################################################################
+
+def writeJournalSnapshot(journal):
+    entry = {'snapshot': dict((f, getFileHash(f)) for f in getIncludeFiles(include_dirs))}
+
+    journal.write(json.dumps(entry) + '\n')
+    journal.flush()
+
+
+####################################################################################################
+#
+#   Function to get the files which need to be checked by the first-pass check when resuming an
+#   interrupted run. When the interrupted run stopped, all files were known to compile (apart from
+#   a file which failed to compile because of a change applied by the run, which the analysis will
+#   find again anyway). So only the files which have changed since, and the files importing them
+#   (directly or not), need to be checked.
+#
+#   Params:
+#       journal_entries = the entries of the journal of the interrupted run
+#       files = list of the files to be analysed
+#
+#   Returns:
+#       the list of the files to be checked
+#
+####################################################################################################
+
+def getFilesToCheckOnResume(journal_entries, files):
+    known_hashes = None
+
+    for entry in journal_entries:
+        if 'snapshot' in entry:
+            known_hashes = dict(entry['snapshot'])
+        elif known_hashes is not None:
+            known_hashes[entry['file']] = entry['hash']
+
+    include_files = getIncludeFiles(include_dirs)
+
+    if known_hashes is None or set(known_hashes) != set(include_files):
+        # Without a snapshot, or if files have been created or deleted since, any file may be
+        # affected
+        return files
+
+    changed_files = [f for f in include_files if getFileHash(f) != known_hashes[f]]
+
+    affected_files = set(changed_files)
+    pending_files = list(changed_files)
+
+    while pending_files:
+        entry = import_graph.get(pending_files.pop())
+        if entry is None:
+            continue
+
+        for importer in module_importers.get(entry['module'], set()):
+            if importer not in affected_files:
+                affected_files.add(importer)
+                pending_files.append(importer)
+
+    return [f for f in files if os.path.abspath(f) in affected_files]
+
+
+####################################################################################################
+#
+#   Function to estimate the cost of analysing each of the given files. Files analysed in previous
+#   runs are expected to take as long as they took the last time. For all other files, the cost is
+#   estimated from their number of imports (each import is a candidate for removal, costing a few
+#   compilations) and their size (which the time of each compilation grows with), scaled to match
+#   the files with known costs.
+#
+#   Params:
+#       files = list of files
+#       costs = dictionary mapping each file analysed in previous runs to a list of the seconds
+#               taken to analyse it and the number of compilations done while analysing it
+#
+#   Returns:
+#       a dictionary mapping each file to its estimated cost in seconds
+#
+####################################################################################################
+
+def getEstimatedCosts(files, costs):
+    weights = {}
+
+    for f in files:
+        entry = import_graph.get(os.path.abspath(f))
+        num_imports = len(entry['imports']) if entry else 0
+
+        try:
+            size = os.path.getsize(f)
+        except OSError:
+            size = 0
+
+        weights[f] = (num_imports + 1) * (size + 1024)
+
+    known = [f for f in files if os.path.abspath(f) in costs]
+
+    known_weight = sum(weights[f] for f in known)
+    if known_weight > 0:
+        seconds_per_weight = sum(costs[os.path.abspath(f)][0] for f in known) / float(known_weight)
+    else:
+        seconds_per_weight = 1.0
+
+    estimates = {}
+
+    for f in files:
+        if os.path.abspath(f) in costs:
+            estimates[f] = costs[os.path.abspath(f)][0]
+        else:
+            estimates[f] = weights[f] * seconds_per_weight
+
+    return estimates
+
+
+####################################################################################################
+#
+#   Function to check whether all files importing the given file still compile. This is done after
+#   every change to a file, so that a change which breaks another file is rolled back immediately.
+#   The importing files are compiled in batches by a pool of worker threads, and the check stops at
+#   the first failure.
+#
+#   Params:
+#       filename = the file which was changed
+#       compile_command = command to be used for the compilation
+#
+#   Returns:
+#       True if all importing files compile, False otherwise
+#
+####################################################################################################
+
+def importersCompile(filename, compile_command):
+    global importers_check_pool
+
+    importers = [getWorkspacePath(f) for f in getImporters(getRealPath(filename))]
+    if not importers:
+        return True
+
+    if interface_files_directory:
+        # The importing files must see the changed file, not an interface file generated from an
+        # older version of it
+        if workspace_directories:
+            updateWorkspaceInterfaceFile(filename)
+        else:
+            updateInterfaceFiles([os.path.abspath(filename)], 1)
+
+    # Threads don't survive a fork, so every process needs to create its own pool
+    if importers_check_pool is None or importers_check_pool[0] != os.getpid():
+        importers_check_pool = (os.getpid(), multiprocessing.pool.ThreadPool(importers_check_jobs))
+
+    failure_event = threading.Event()
+    tasks = [(batch, compile_command, failure_event, "importers check")
+             for batch in splitIntoBatches(importers, importers_check_jobs)]
+
+    all_compile = True
+
+    # All batches are waited for, even after a failure: a batch still compiling would otherwise
+    # read the next contents of the file written by the caller, while caching its result under the
+    # key of the current contents. The remaining compilations are skipped because of the failure
+    # event, so the wait is short.
+    results = importers_check_pool[1].imap_unordered(checkBatchUnlessFailed, tasks)
+    for batch, failed_file in waitForResults(results):
+        if failed_file:
+            all_compile = False
+
+    return all_compile
+
+
+####################################################################################################
+#
+#   Function to print the changes which would be made to a file as a unified diff.
+#
+#   Params:
+#       filename = the file
+#       contents = the new contents of the file (bytes)
+#
+####################################################################################################
+
+def printDiff(filename, contents):
+    with open(filename, 'rb') as in_file:
+        old_lines = in_file.read().decode('utf-8', 'replace').splitlines(True)
+
+    new_lines = contents.decode('utf-8', 'replace').splitlines(True)
+
+    for line in difflib.unified_diff(old_lines, new_lines, filename, filename):
+        sys.stdout.write(line if line.endswith('\n') else line + '\n')
+    print("")
+
+
+####################################################################################################
+#
+#   Function to display a progress bar to indicate the status of the program.
+#
+#   Params:
+#       progress = a floating point integer between 0 and 1 indicating how much of the program is
+#                  done (0 implies nothing is done, 1 implies the program is complete)
+#
+#   Returns:
+#       a set containing all errors (to be thought of as a set of suggestions)
+#
+####################################################################################################
+
+def updateProgress(progress):
+    bar_len = 80 # Modify this to change the length of the progress bar
+
+    if not isinstance(progress, float):
+        return
+
+    if progress < 0:
+        progress = 0
+    elif progress >= 1:
+        progress = 1
+
+    block = int(round(bar_len * progress))
+    text = "Status: [{0}] {1}%".format( "="*(block-1) + ">" + " "*(bar_len-block-1), int(progress*100))
+
+    removeProgressBar()
+
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+####################################################################################################
+#
+#   Function to remove the progress bar.
+#
+####################################################################################################
+
+def removeProgressBar():
+    sys.stdout.write("\r")
+    sys.stdout.write("\033[K") # Clear to the end of line
+    sys.stdout.flush()
+
+
+####################################################################################################
+#
+#   Function to make a first-pass check on the given files using the given compile command. The
+#   files are compiled in batches by a pool of worker threads, and the check stops at the first
+#   failure.
+#
+#   Params:
+#       files = list of all files to be compiled
+#       compile_command = command to be used for the compilation
+#       jobs = number of files to compile in parallel
+#
+#   Returns:
+#       string containing the first file that failed to compile, an empty string if all files
+#       compiled successfully
+#
+####################################################################################################
+
+def makeFirstPassCheck(files, compile_command, jobs):
+    failed_file = ""
+    files_done = 0
+    total_files = len(files)
+
+    failure_event = threading.Event()
+    tasks = [(batch, compile_command, failure_event, "first-pass")
+             for batch in splitIntoBatches(files, jobs)]
+
+    pool = multiprocessing.pool.ThreadPool(jobs)
+
+    try:
+        updateProgress(0.0)
+
+        for batch, batch_failed_file in waitForResults(pool.imap_unordered(checkBatchUnlessFailed,
+                                                                           tasks)):
+            if batch_failed_file is None:
+                continue
+
+            if batch_failed_file:
+                failed_file = batch_failed_file
+                break
+
+            files_done += len(batch)
+            updateProgress(files_done / float(total_files))
+    finally:
+        # Compilations which have not yet started are skipped because of the failure event, so
+        # this only waits for the ones already running
+        failure_event.set()
+        pool.terminate()
+        pool.join()
+
+    removeProgressBar()
+    return failed_file
+
+
+####################################################################################################
+#
+#   Function to create a pool of worker processes.
+#
+#   Params:
+#       jobs = number of worker processes
+#       initializer = function to be called in each worker process when it starts
+#       initargs = arguments to be passed to the initializer
+#
+#   Returns:
+#       the pool of worker processes
+#
+####################################################################################################
+
+def makeWorkerPool(jobs, initializer, initargs):
+    # The workers rely on inheriting the parsed arguments from this process, so they must always be
+    # forked (newer python 3 versions default to 'forkserver' on Linux)
+    if hasattr(multiprocessing, 'get_context'):
+        return multiprocessing.get_context('fork').Pool(jobs, initializer, initargs)
+
+    return multiprocessing.Pool(jobs, initializer, initargs)
+
+
+####################################################################################################
+#
+#   Function to wait for the results of a pool's 'imap()' or 'imap_unordered()'.
+#
+#   Params:
+#       results = the iterator returned by 'imap()' or 'imap_unordered()'
+#
+#   Returns:
+#       a generator of the results
+#
+####################################################################################################
+
+def waitForResults(results):
+    while True:
+        try:
+            # The timeout is only there to keep the wait interruptible by Ctrl-C (python 2 blocks
+            # signals while waiting on a condition without a timeout)
+            yield results.next(3600)
+        except multiprocessing.TimeoutError:
+            continue
+        except StopIteration:
+            return
+
+
+####################################################################################################
+#
+#   Function to create a workspace, i.e. an isolated view of the include directories in which files
+#   can be edited and compiled without affecting the real tree (or other workspaces). Each include
+#   directory is mirrored by a symbolic link to it, which is turned into a real directory (of
+#   symbolic links to its entries) only when a file within it needs to be edited (see
+#   'makeWorkspaceFilePrivate()'). Everything not edited in the workspace thus always shows the
+#   current state of the real tree.
+#
+#   Params:
+#       workspace_directory = directory in which to create the workspace (must not exist)
+#       include_dirs = list of include directories to be mirrored
+#
+####################################################################################################
+
+def createWorkspace(workspace_directory, include_dirs):
+    global workspace_directories
+
+    os.mkdir(workspace_directory)
+
+    workspace_directories = []
+
+    for i, include_dir in enumerate(include_dirs):
+        mirror = os.path.join(workspace_directory, str(i))
+        os.symlink(os.path.abspath(include_dir), mirror)
+        workspace_directories.append((os.path.abspath(include_dir), mirror))
+
+    # Nested include directories are mapped using the innermost one
+    workspace_directories.sort(key=lambda d: len(d[0]), reverse=True)
+
+
+####################################################################################################
+#
+#   Function to get the path under which a file of the real tree appears in the workspace.
+#
+#   Params:
+#       path = path of the file (or directory) in the real tree
+#
+#   Returns:
+#       the path in the workspace, the given path if there is no workspace or the file is not within
+#       an include directory
+#
+####################################################################################################
+
+def getWorkspacePath(path):
+    if not workspace_directories:
+        return path
+
+    abs_path = os.path.abspath(path)
+
+    for real_dir, mirror in workspace_directories:
+        if abs_path == real_dir or abs_path.startswith(real_dir + os.sep):
+            return mirror + abs_path[len(real_dir):]
+
+    return path
+
+
+####################################################################################################
+#
+#   Function to get the path in the real tree of a file in the workspace (the reverse of
+#   'getWorkspacePath()').
+#
+#   Params:
+#       path = path of the file (or directory) in the workspace
+#
+#   Returns:
+#       the path in the real tree, the given path if it is not within the workspace
+#
+####################################################################################################
+
+def getRealPath(path):
+    for real_dir, mirror in workspace_directories:
+        if path == mirror or path.startswith(mirror + os.sep):
+            return real_dir + path[len(mirror):]
+
+    return path
+
+
+####################################################################################################
+#
+#   Functions to convert a compilation command between the real tree and the workspace, i.e. to
+#   convert the include directories and the compiled files.
+#
+#   Params:
+#       command = the command to be converted
+#
+#   Returns:
+#       the converted command
+#
+####################################################################################################
+
+def getWorkspaceCommand(command):
+    return [("-I" + getWorkspacePath(arg[2:])) if arg.startswith("-I") else
+            (arg if arg.startswith("-") else getWorkspacePath(arg)) for arg in command]
+
+def getRealCommand(command):
+    return [("-I" + getRealPath(arg[2:])) if arg.startswith("-I") else getRealPath(arg)
+            for arg in command]
+
+
+####################################################################################################
+#
+#   Function to make a file of the workspace private, i.e. to replace it by a copy which can be
+#   edited without affecting the real tree. The directories containing the file are turned into real
+#   directories as needed.
+#
+#   Params:
+#       path = path of the file in the workspace (the file need not exist in the real tree)
+#
+####################################################################################################
+
+def makeWorkspaceFilePrivate(path):
+    real_path = getRealPath(path)
+
+    for real_dir, mirror in workspace_directories:
+        if path.startswith(mirror + os.sep):
+            break
+    else:
+        raise ValueError("'" + path + "' is not within the workspace")
+
+    directory = mirror
+    components = path[len(mirror) + 1:].split(os.sep)
+
+    for component in [None] + components[:-1]:
+        if component is not None:
+            directory = os.path.join(directory, component)
+
+        if os.path.islink(directory):
+            target = os.readlink(directory)
+            os.remove(directory)
+            os.mkdir(directory)
+            for entry in os.listdir(target):
+                os.symlink(os.path.join(target, entry), os.path.join(directory, entry))
+        elif not os.path.isdir(directory):
+            os.mkdir(directory)
+
+    if os.path.islink(path):
+        os.remove(path)
+        if os.path.isfile(real_path):
+            shutil.copyfile(real_path, path)
+
+    workspace_private_files[real_path] = path
+
+
+####################################################################################################
+#
+#   Function to reset all private files of the workspace, so that the workspace shows the current
+#   state of the real tree again.
+#
+####################################################################################################
+
+def resetWorkspace():
+    for real_path, path in workspace_private_files.items():
+        if os.path.lexists(path):
+            os.remove(path)
+        os.symlink(real_path, path)
+
+    workspace_private_files.clear()
+
+
+####################################################################################################
+#
+#   Function to bring the interface file of a file being edited in the workspace up to date, so that
+#   the files importing it see the edited version.
+#
+#   Params:
+#       filename = the edited file (in the workspace)
+#
+####################################################################################################
+
+def updateWorkspaceInterfaceFile(filename):
+    module = interface_sources.get(getRealPath(filename))
+    if module is None:
+        return
+
+    interface_file = getWorkspacePath(os.path.join(interface_files_directory,
+                                                   module.replace('.', '/') + ".di"))
+    makeWorkspaceFilePrivate(interface_file)
+
+    writeInterfaceFile(getWorkspaceCommand(interface_compile_command), filename, interface_file)
+
+
+####################################################################################################
+#
+#   Function to initialise a process which analyses files. Each such process gets its own
+#   temporary directory, so that the temporary files of different processes never clash, and its
+#   own workspace, in which files are edited and compiled.
+#
+#   Params:
+#       tmp_directory = directory in which to create the temporary directory of the process
+#       include_dirs = list of include directories to be mirrored by the workspace
+#       ignore_interrupts = whether SIGINT should be ignored (it is the job of the main process to
+#                           handle Ctrl-C when running with multiple processes)
+#
+####################################################################################################
+
+def initAnalysisWorker(tmp_directory, include_dirs, ignore_interrupts):
+    global worker_tmp_directory
+
+    if ignore_interrupts:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    worker_tmp_directory = tempfile.mkdtemp(dir=tmp_directory)
+
+    createWorkspace(os.path.join(worker_tmp_directory, 'workspace'), include_dirs)
+
+
+####################################################################################################
+#
+#   Function to analyse a single file in a process initialised using 'initAnalysisWorker()'. The
+#   file is analysed (and edited) in the workspace of the process, the real tree is not touched.
+#
+#   Params:
+#       task = tuple of the file to be analysed and the command to be used for compiling it
+#
+#   Returns:
+#       a tuple of the analysed file, the set of errors returned by 'analyseFile()', whether the
+#       file was modified or not, a list of the seconds taken to analyse the file and the number
+#       of compilations done while analysing it, the new contents of the file (None if the file
+#       was not modified) and the number of changes made to the real tree before the analysis
+#       started (see 'noteIncludeFilesChanged()')
+#
+####################################################################################################
+
+def analyseFileInWorker(task):
+    global traced_file, traced_file_totals
+
+    f, compile_command = task
+
+    generation = include_generation.value
+    start_time = time.time()
+    traced_file = f
+    traced_file_totals = {'compiles': 0, 'cache_hits': 0, 'compile_seconds': 0.0}
+
+    workspace_file = getWorkspacePath(f)
+    makeWorkspaceFilePrivate(workspace_file)
+
+    try:
+        errors = analyseFile(workspace_file, getWorkspaceCommand(compile_command),
+                             worker_tmp_directory)
+
+        with open(f, 'rb') as in_file:
+            old_contents = in_file.read()
+        with open(workspace_file, 'rb') as in_file:
+            new_contents = in_file.read()
+    finally:
+        resetWorkspace()
+
+    modified = new_contents != old_contents
+
+    # The totals of the file are recorded as a single event spanning its whole analysis
+    totals = traced_file_totals
+    traced_file = None
+    traced_file_totals = None
+
+    duration = time.time() - start_time
+
+    totals['file'] = f
+    totals['modified'] = modified
+    totals['compile_seconds'] = round(totals['compile_seconds'], 6)
+    writeTraceEvent({
+        'name': os.path.basename(f),
+        'cat': 'analysis',
+        'ph': 'X',
+        'ts': int(start_time * 1000000),
+        'dur': int(duration * 1000000),
+        'pid': os.getpid(),
+        'tid': threading.current_thread().ident,
+        'args': totals,
+    })
+
+    return (f, errors, modified, [round(duration, 3), totals['compiles']],
+            new_contents if modified else None, generation)
+
+
+####################################################################################################
+#
+#   Function to analyse the given files, either one after the other or using a pool of worker
+#   processes. In both cases, the results are returned in the same order as the given files.
+#
+#   Params:
+#       files = list of all files to be analysed
+#       compile_command = command to be used for the compilation
+#       pool = pool of worker processes to use, None to analyse the files in this process
+#       estimated_costs = dictionary mapping each file to its estimated cost (used to schedule the
+#                         files when using a pool)
+#
+#   Returns:
+#       a generator of the tuples returned by 'analyseFileInWorker()'
+#
+####################################################################################################
+
+def analyseFiles(files, compile_command, pool, estimated_costs):
+    tasks = [(f, compile_command) for f in files]
+
+    if pool is None:
+        for task in tasks:
+            yield analyseFileInWorker(task)
+        return
+
+    # The most expensive files are started first, so that the run doesn't end waiting for a few
+    # expensive files started last. The results are buffered until they can be returned in order.
+    scheduled_tasks = sorted(tasks, key=lambda task: estimated_costs[task[0]], reverse=True)
+    file_indexes = dict((f, i) for i, f in enumerate(files))
+
+    pending_results = {}
+    next_index = 0
+
+    for result in waitForResults(pool.imap_unordered(analyseFileInWorker, scheduled_tasks)):
+        pending_results[file_indexes[result[0]]] = result
+
+        while next_index in pending_results:
+            yield pending_results.pop(next_index)
+            next_index += 1
+
+
+####################################################################################################
+#
+#   Function to check whether the changes made to a file still build on top of the current state of
+#   the real tree, i.e. along with the changes applied to other files since the file was analysed
+#   (when analysing files in parallel). The file and the files importing it are compiled in the
+#   workspace of this process.
+#
+#   Params:
+#       f = the analysed file
+#       contents = the new contents of the file (bytes)
+#       compile_command = command to be used for the compilation
+#
+#   Returns:
+#       True if the file and all files importing it compile with the new contents, False otherwise
+#
+####################################################################################################
+
+def changesStillCompile(f, contents, compile_command):
+    workspace_file = getWorkspacePath(f)
+    makeWorkspaceFilePrivate(workspace_file)
+
+    try:
+        replaceFile(workspace_file, contents)
+
+        workspace_command = getWorkspaceCommand(compile_command)
+
+        return (compileFile(workspace_file, workspace_command, [], "merge check") == 0 and
+                importersCompile(workspace_file, workspace_command))
+    finally:
+        resetWorkspace()
+
+
+####################################################################################################
+#
+#   An exception raised when the changes applied to the files have caused a build failure
+#
+####################################################################################################
+
+class BuildFailureException(Exception):
+    pass
+
+
+####################################################################################################
+#
+#   Function to analyse the given files and apply the results, i.e. to apply the changes made to
+#   each file (or to print them, if only reporting) and to print its suggestions. A build failure
+#   stops the analysis, as one of the applied changes must be at fault.
+#
+#   Params:
+#       files = list of the files to be analysed
+#       journal = the open journal file in which to record the analysed files (None if no journal
+#                 is kept)
+#
+#   Throws:
+#       BuildFailureException if a file failed to compile (after the details of the failure have
+#       been printed). The exception has the failing file as its argument.
+#
+####################################################################################################
+
+def analyseAndApplyFiles(files, journal):
+    global files_done, files_modified, files_with_suggestions
+
+    if len(files) == 0:
+        return
+
+    if (args['jobs'] or 1) > 1:
+        pool = makeWorkerPool(args['jobs'], initAnalysisWorker,
+                              (tmp_directory, workspace_include_dirs, True))
+    else:
+        pool = None
+
+    # This process needs a workspace as well, to analyse the files itself or to check the results
+    # of the workers
+    initAnalysisWorker(tmp_directory, workspace_include_dirs, False)
+
+    try:
+        updateProgress(files_done / float(total_files))
+
+        estimated_costs = getEstimatedCosts(files, file_costs)
+
+        for result in analyseFiles(files, compile_command, pool, estimated_costs):
+            f, errors, modified, cost, contents, generation = result
+
+            if (modified and not args['report_only'] and generation != include_generation.value and
+                    not changesStillCompile(f, contents, compile_command)):
+                # Changes applied to other files since the file was analysed conflict with its
+                # changes, so analyse it again (nothing else is applied to the real tree meanwhile)
+                f, errors, modified, cost, contents, generation = analyseFileInWorker(
+                    (f, compile_command))
+
+            files_done += 1
+            file_costs[os.path.abspath(f)] = cost
+
+            # Note 'report_only' instead of 'report-only' since the hyphen is automatically
+            # converted to an underscore
+            if modified and args['report_only']:
+                files_modified += 1
+
+                removeProgressBar()
+                printDiff(f, contents)
+            elif modified:
+                files_modified += 1
+                noteIncludeFilesChanged()
+                replaceFile(f, contents)
+                updateImportGraph(import_graph, module_importers, f)
+
+                if interface_files_directory:
+                    updateInterfaceFiles([os.path.abspath(f)], 1)
+
+                noteIncludeFilesChanged()
+
+            if (len(errors)):
+                removeProgressBar()
+
+                if "BUILD FAILURE" in errors:
+                    print("One or more changes made in one of the " + str(files_modified) +
+                          " modified files has caused a build failure in:")
+                    print("    " + f)
+                    print("")
+
+                    print("Build command used:")
+                    print(" ".join(compile_command + [f]))
+                    print("")
+
+                    print("Please identify this change(s), revert only the relevant change(s), " +
+                          "and add that file to the skiplist.")
+                    print("This will prevent the same modification(s) from being performed in " +
+                          "the next run.")
+                    print("")
+
+                    raise BuildFailureException(f)
+
+                files_with_suggestions += 1
+
+                print(f + ":")
+                for e in errors:
+                    print(e)
+                print("")
+
+            if journal is not None:
+                writeJournalEntry(journal, f, errors, modified)
+
+            updateProgress(files_done / float(total_files))
+    finally:
+        # The workers can be terminated safely even while they are analysing files, as they only
+        # ever edit the files of their own workspaces (the real tree is only ever written by this
+        # process, and atomically, see 'replaceFile()')
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+# The events to watch for in '--watch' mode (editors often save a file by writing a new file and
+# renaming it over the old one)
+watch_mask = (inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO | inotify.IN_MOVED_FROM |
+              inotify.IN_CREATE | inotify.IN_DELETE)
+
+
+####################################################################################################
+#
+#   Function to end the program once it has been interrupted by Ctrl-C. The temporary files are
+#   removed on exit (see 'atexit'), and the real tree is never left half-written, as files are only
+#   ever replaced atomically.
+#
+#   Params:
+#       can_resume = whether the journal of the run has been kept, i.e. whether the run can be
+#                    resumed
+#
+####################################################################################################
+
+def exitInterrupted(can_resume):
+    removeProgressBar()
+    print("")
+    print("Interrupted.")
+    if can_resume:
+        print("Run again with '--resume' to continue from where this run stopped.")
+
+    sys.exit(130)
+
+
+####################################################################################################
+#
+#   Function to wait for changes to the D files in the watched directories. Once a change is seen,
+#   further changes are collected until there have been none for a moment, so that a file saved in
+#   several steps (or several files saved at once) are handled together.
+#
+#   Params:
+#       fd = the file descriptor of the inotify instance
+#       watches = dictionary mapping each watch descriptor to its directory (directories created
+#                 in the meantime are watched as well, and added to it)
+#
+#   Returns:
+#       the set of the changed (or created, or deleted) files
+#
+####################################################################################################
+
+def waitForChangedFiles(fd, watches):
+    changed_files = set()
+    timeout = None
+
+    while True:
+        events = inotify.read_events(fd, timeout)
+        if len(events) == 0:
+            return changed_files
+
+        for event in events:
+            if event.mask & inotify.IN_Q_OVERFLOW:
+                # Some events were lost, so any of the files may have changed
+                for root, subdirs, filenames in os.walk(cwd + "/src"):
+                    for filename in fnmatch.filter(filenames, "*.d"):
+                        changed_files.add(os.path.join(root, filename))
+                changed_files.update(analysable_files)
+                continue
+
+            directory = watches.get(event.wd)
+            if directory is None:
+                continue
+
+            if event.mask & inotify.IN_IGNORED:
+                del watches[event.wd]
+                continue
+
+            path = os.path.join(directory, event.name)
+
+            if event.mask & inotify.IN_ISDIR:
+                if event.mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+                    # The directory may have been filled before it was watched
+                    inotify.add_tree_watches(fd, path, watch_mask, watches)
+                    for root, subdirs, filenames in os.walk(path):
+                        for filename in fnmatch.filter(filenames, "*.d"):
+                            changed_files.add(os.path.join(root, filename))
+                else:
+                    changed_files.update(f for f in analysable_files
+                                         if f.startswith(path + os.sep))
+            elif fnmatch.fnmatch(event.name, "*.d"):
+                changed_files.add(path)
+
+        timeout = 0.2
+
+
+####################################################################################################
+#
+#   Function to keep watching src/ for changes, and to analyse every changed file along with the
+#   files importing it. Everything loaded by the analysis so far (the import graph, the export
+#   index, the hashes of the files and the first-pass results of the unchanged files) is kept
+#   between the changes. Returns once interrupted by Ctrl-C.
+#
+####################################################################################################
+
+def watchSourceFiles():
+    global files_done, files_modified, files_with_suggestions, total_files
+
+    fd = inotify.init()
+
+    try:
+        watches = {}
+        inotify.add_tree_watches(fd, cwd + "/src", watch_mask, watches)
+
+        # The hashes of the files as they were last analysed, so that files saved without any
+        # changes (and the changes made by the analysis itself) are ignored
+        known_hashes = dict((f, getFileHash(f)) for f in analysable_files)
+
+        # Files whose analysis was put off because of a file which failed to compile
+        pending_files = set()
+
+        print("")
+        print("Watching '" + cwd + "/src' for changes (press Ctrl-C to stop) ...")
+
+        while True:
+            changed_files = [f for f in sorted(waitForChangedFiles(fd, watches))
+                             if f not in files_to_skip and getFileHash(f) != known_hashes.get(f)]
+            if len(changed_files) == 0:
+                continue
+
+            # Files importing a changed file are analysed as well, as the change may have made some
+            # of their imports unnecessary (the importers of deleted files are only known before
+            # the import graph is updated)
+            files_to_analyse = set(pending_files)
+            for f in changed_files:
+                files_to_analyse.update(getImporters(f))
+
+            # The set of D files may have changed
+            include_files_cache.clear()
+            module_directories_cache.clear()
+
+            for f in changed_files:
+                updateImportGraph(import_graph, module_importers, f)
+                if not args['library']:
+                    updateExportIndex(export_index, f)
+
+                if os.path.isfile(f):
+                    analysable_files.add(os.path.abspath(f))
+                    files_to_analyse.add(os.path.abspath(f))
+                    files_to_analyse.update(getImporters(f))
+                    known_hashes[f] = getFileHash(f)
+                else:
+                    analysable_files.discard(os.path.abspath(f))
+                    known_hashes.pop(f, None)
+
+            if interface_files_directory:
+                updateInterfaceFiles([os.path.abspath(f) for f in changed_files
+                                      if os.path.abspath(f) in interface_sources and
+                                      os.path.isfile(f)], 1)
+
+            noteIncludeFilesChanged()
+
+            watched_files = sorted(files_to_analyse & analysable_files)
+
+            print("")
+            for f in changed_files:
+                print("Changed: " + f)
+            print("Files to analyse    : " + str(len(watched_files)))
+
+            failed_file = makeFirstPassCheck(watched_files, compile_command,
+                args['jobs'] or multiprocessing.cpu_count())
+
+            if failed_file:
+                print("File '" + failed_file + "' failed to compile. Will analyse the files once " +
+                      "it's fixed.")
+                pending_files = set(watched_files)
+                continue
+
+            pending_files = set()
+
+            files_done = 0
+            files_modified = 0
+            files_with_suggestions = 0
+            total_files = len(watched_files)
+
+            build_failed = False
+            try:
+                analyseAndApplyFiles(watched_files, None)
+            except BuildFailureException:
+                build_failed = True
+            removeProgressBar()
+
+            # Note 'report_only' instead of 'report-only' since the hyphen is automatically
+            # converted to an underscore
+            if not args['report_only'] and not build_failed:
+                saveAnalysedFiles(state_file, watched_files)
+
+            # The changes applied by the analysis mustn't be taken for changes of the user
+            for f in watched_files:
+                known_hashes[f] = getFileHash(f)
+
+            if build_failed:
+                print("Will analyse the files again once the build failure is fixed.")
+                pending_files = set(watched_files)
+                continue
+
+            if args['report_only']:
+                print("Files which can be automatically modified: " + str(files_modified))
+            else:
+                print("Files automatically modified: " + str(files_modified))
+            print("Files with suggestions: " + str(files_with_suggestions))
+    except KeyboardInterrupt:
+        removeProgressBar()
+        print("")
+        print("Stopped watching.")
+    finally:
+        os.close(fd)
+
+
+####################################################################################################
+#
+#    Execution starts here! [main :)]
+#
+####################################################################################################
+
+parser = argparse.ArgumentParser(usage='./%(prog)s [ARGUMENTS]', description='Imports Analyser')
+parser.add_argument('-j', '--jobs', type=int, required = False,
+    default = None, help = 'Number of files to analyse in parallel (default: 1). Every file is ' +
+    'edited in an isolated workspace, and its accepted changes are applied to the tree once ' +
+    'they have been checked against the changes applied to other files meanwhile. ' +
+    'The first-pass check compiles this many files in parallel (default: number of CPUs).')
+parser.add_argument('-r', '--report-only', action='store_true', required = False,
+    default = False, help = 'Do not modify any files, only report the changes which would be made')
+parser.add_argument('--di-stubs', action='store_true', required = False, default = False,
+    help = 'Generate interface files (.di) for all imported modules and compile against those ' +
+    'instead of the full sources (interface files are regenerated only when a source changes)')
+parser.add_argument('-b', '--batch-size', type=int, required = False, default = 50,
+    help = 'Maximum number of files compiled by a single run of the compiler in the first-pass ' +
+    'check and when checking the files importing a changed file (default: 50)')
+parser.add_argument('-l', '--library', action='store_true', required = False,
+    default = False, help = 'Do not attempt selective imports (bug # 314)')
+parser.add_argument('--cache-dir', required = False, default = None,
+    help = 'Directory in which to keep state across runs (default: a per-project directory ' +
+    'under ~/.cache/imports_analyser)')
+parser.add_argument('--cache-size', type=int, required = False, default = 256,
+    help = 'Maximum size of the compile cache in MB (default: 256)')
+parser.add_argument('--no-cache', action='store_true', required = False, default = False,
+    help = 'Always run the compiler, neither using nor updating the compile cache')
+parser.add_argument('-s', '--since', required = False, default = None, metavar = 'REF',
+    help = 'Only analyse files changed since the given git reference (and the files importing ' +
+    'them)')
+parser.add_argument('-i', '--incremental', action='store_true', required = False,
+    default = False, help = 'Only analyse files changed since they were last analysed (and ' +
+    'the files importing them)')
+parser.add_argument('--trace', required = False, default = None, metavar = 'FILE',
+    help = 'Record every compilation in FILE (as JSON lines in the Chrome trace event format, ' +
+    "e.g. convert using 'jq -s .') and print the slowest files at the end")
+parser.add_argument('-w', '--watch', action='store_true', required = False, default = False,
+    help = 'After the analysis, keep watching src/ for changes and analyse every saved file ' +
+    'along with the files importing it (combine with --incremental to only analyse the files ' +
+    'changed since the last run first)')
+parser.add_argument('--resume', action='store_true', required = False, default = False,
+    help = 'Resume an interrupted run, skipping the files it analysed which have not changed ' +
+    'since (the first-pass check only compiles the files affected by changes made since)')
+parser.add_argument('--force', action='store_true', required = False, default = False,
+    help = 'Discard the journal of an interrupted run (which otherwise prevents starting a new ' +
+    'run without --resume)')
+args = vars(parser.parse_args())
+
+cwd = os.getcwd()
+
+if not os.path.isdir(cwd + "/src"):
+    print("'" + cwd + "/src' doesn't exist. Aborting.")
+    sys.exit(1)
+
+if args['jobs'] is not None and args['jobs'] < 1:
+    print("Number of jobs must be at least 1. Aborting.")
+    sys.exit(1)
+
+if args['batch_size'] < 1:
+    print("Batch size must be at least 1. Aborting.")
+    sys.exit(1)
+
+if args['since'] and args['incremental']:
+    print("'--since' and '--incremental' cannot be used together. Aborting.")
+    sys.exit(1)
+
+# Note 'report_only' instead of 'report-only' since the hyphen is automatically converted to an
+# underscore
+if args['resume'] and args['report_only']:
+    print("'--resume' and '--report-only' cannot be used together. Aborting.")
+    sys.exit(1)
+
+if args['resume'] and args['force']:
+    print("'--resume' and '--force' cannot be used together. Aborting.")
+    sys.exit(1)
+
+if args['since'] and not git.is_valid_commit(args['since']):
+    print("'" + args['since'] + "' is not a valid git commit. Aborting.")
+    sys.exit(1)
+
+files_to_skip = set()
+
+if os.path.isfile(cwd + "/skiplist.txt"):
+    with open(cwd + "/skiplist.txt", 'r') as in_file:
+        for line in in_file:
+            line = line.strip()
             if not os.path.isfile(line):
                 print("Skiplist file '" + line + "' not found. Will ignore.")
             else:
@@ -682,91 +3279,254 @@ total_files = len(files) + len(files_to_skip)
 
 print("Total D files found : " + str(total_files))
 print("Files to skip       : " + str(len(files_to_skip)))
-print("Files to analyse    : " + str(len(files)))
-print("")
 
-compile_command = getCompileCommand(cwd)
+trace_fd = None
+trace_lock = threading.Lock()
+traced_file = None
+traced_file_totals = None
+
+if args['trace']:
+    trace_fd = os.open(args['trace'], os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND)
+
+state_directory = args['cache_dir'] or getStateDirectory(cwd)
+
+if not os.path.isdir(state_directory):
+    os.makedirs(state_directory)
+
+interface_files_directory = None
+
+# Note 'di_stubs' instead of 'di-stubs' since the hyphen is automatically converted to an underscore
+if args['di_stubs']:
+    interface_files_directory = os.path.join(state_directory, 'di_stubs')
+
+compile_command = getCompileCommand(cwd, interface_files_directory)
+
+# The include directories of the project itself (i.e. without the interface files)
+include_dirs = [arg[2:] for arg in compile_command
+                if arg.startswith("-I") and arg[2:] != interface_files_directory]
+
+include_files_cache = {}
+include_fingerprint_cache = {}
+# Counts the changes to the real tree (see 'noteIncludeFilesChanged()'). It is shared with the
+# worker processes, which compile against the real tree as well.
+include_generation = multiprocessing.RawValue('l', 0)
+module_directories_cache = {}
+required_include_dirs_cache = {}
+file_hash_cache = {}
+compile_cache_directory = None
+
+# The workspace of this process (only the analysing processes create one, see 'createWorkspace()')
+workspace_directories = []
+workspace_private_files = {}
+
+# Note 'no_cache' instead of 'no-cache' since the hyphen is automatically converted to an underscore
+if not args['no_cache']:
+    compile_cache_directory = os.path.join(state_directory, 'compile_cache')
+    if not os.path.isdir(compile_cache_directory):
+        os.makedirs(compile_cache_directory)
+    atexit.register(trimCompileCache, compile_cache_directory, args['cache_size'] * 1024 * 1024)
+
+# The import graph is used to find the files to check after every change to a file
+graph_file = os.path.join(state_directory, 'import_graph.json')
+import_graph = loadImportGraph(include_dirs, graph_file)
+module_importers = getModuleImporters(import_graph)
+atexit.register(saveJson, graph_file, import_graph)
+
+# The export index is used to find the symbols to be imported selectively without building the files
+export_index = {}
+module_exports = {}
+
+if not args['library']:
+    index_file = os.path.join(state_directory, 'export_index.json')
+    export_index = loadExportIndex(include_dirs, index_file)
+    atexit.register(saveJson, index_file, export_index)
+
+interface_sources = {}
+interface_files_manifest = {}
+
+if interface_files_directory:
+    interface_compile_command = [arg for arg in compile_command
+                                 if arg != "-I" + interface_files_directory]
+    interface_sources = getInterfaceSources(module_importers, include_dirs)
+
+    if not os.path.isdir(interface_files_directory):
+        os.makedirs(interface_files_directory)
+    manifest_file = os.path.join(interface_files_directory, 'manifest.json')
+    interface_files_manifest = loadJson(manifest_file, "Interface files manifest") or {}
+    atexit.register(saveJson, manifest_file, interface_files_manifest)
+
+    print("Generating interface files for " + str(len(interface_sources)) + " modules ...")
+    updateInterfaceFiles(sorted(interface_sources), args['jobs'] or multiprocessing.cpu_count())
+
+analysable_files = set(os.path.abspath(f) for f in files)
+
+state_file = os.path.join(state_directory, 'analysed_files.json')
+
+changed_files = None
+
+if args['since']:
+    changed_files = getFilesChangedSince(args['since'], files)
+    print("Files changed since '" + args['since'] + "' : " + str(len(changed_files)))
+elif args['incremental']:
+    changed_files = getFilesChangedSinceLastRun(state_file, files)
+    print("Files changed since the last run : " + str(len(changed_files)))
+
+if changed_files is not None:
+    # Files importing a changed file are analysed as well, as the change may have made some of
+    # their imports unnecessary
+    files_to_analyse = set(os.path.abspath(f) for f in changed_files)
+    for f in changed_files:
+        files_to_analyse.update(getImporters(f))
+
+    files = [f for f in files if os.path.abspath(f) in files_to_analyse]
+    total_files = len(files)
+
+    if (len(files) == 0 and not args['watch']):
+        print("No changed D files to analyse. Nothing to do.")
+        sys.exit(0)
+
+# The journal records every analysed file, so that an interrupted run can be resumed
+journal_file = os.path.join(state_directory, 'journal.jsonl')
+journal_entries = loadJournal(journal_file)
+resumed_entries = []
+files_to_check = files
+
+# Note 'report_only' instead of 'report-only' since the hyphen is automatically converted to an
+# underscore
+if (len(journal_entries) and not args['resume'] and not args['force'] and
+    not args['report_only']):
+    print("The journal of an interrupted run exists ('" + journal_file + "').")
+    print("Use '--resume' to continue that run, or '--force' to discard it and start afresh.")
+    print("Aborting.")
+    sys.exit(1)
+
+if args['resume']:
+    if len(journal_entries) == 0:
+        print("No interrupted run to resume. Will analyse all files.")
+    else:
+        latest_entries = dict((entry['file'], entry) for entry in journal_entries
+                              if 'file' in entry)
+        resumed_entries = [latest_entries[f] for f in files
+                           if f in latest_entries and latest_entries[f]['hash'] == getFileHash(f)]
+        resumed_files = set(entry['file'] for entry in resumed_entries)
+        files = [f for f in files if f not in resumed_files]
+        print("Files already analysed by the interrupted run : " + str(len(resumed_entries)))
 
-print("Making a first-pass check to see if all files compile ...")
+        files_to_check = getFilesToCheckOnResume(journal_entries, files)
 
-failed_file = makeFirstPassCheck(files, compile_command)
-sys.stdout.write("\033[1A") # Go up one line
+print("Files to analyse    : " + str(len(files)))
+print("")
 
-if not failed_file:
-    print("Making a first-pass check to see if all files compile ... DONE")
+if len(files_to_check) == 0:
+    print("No file to analyse is affected by changes since the interrupted run, skipping the " +
+          "first-pass check.")
     print("Starting imports analysis now...")
     print("")
 else:
-    print("Making a first-pass check to see if all files compile ... FAILED")
-    print("")
+    if len(files_to_check) < len(files):
+        print("Files affected by changes since the interrupted run : " +
+              str(len(files_to_check)))
+
+    print("Making a first-pass check to see if all files compile ...")
+
+    try:
+        failed_file = makeFirstPassCheck(files_to_check, compile_command,
+            args['jobs'] or multiprocessing.cpu_count())
+    except KeyboardInterrupt:
+        exitInterrupted(False)
+    sys.stdout.write("\033[1A") # Go up one line
+
+    if not failed_file:
+        print("Making a first-pass check to see if all files compile ... DONE")
+        print("Starting imports analysis now...")
+        print("")
+    else:
+        print("Making a first-pass check to see if all files compile ... FAILED")
+        print("")
 
-    print("File '" + failed_file + "' failed to compile.")
-    print("Please fix this manually before attempting again.")
-    print("Build command used:")
-    for p in compile_command: print p,
-    print(failed_file)
-    print("")
+        print("File '" + failed_file + "' failed to compile.")
+        print("Please fix this manually before attempting again.")
+        print("Build command used:")
+        print(" ".join(compile_command + [failed_file]))
+        print("")
 
-    print("Aborting.")
-    sys.exit(3)
+        print("Aborting.")
+        sys.exit(3)
 
-tmp_directory = tempfile.mkdtemp()
+tmp_directory = tempfile.mkdtemp(dir=getScratchParentDirectory())
+atexit.register(shutil.rmtree, tmp_directory, True)
+
+# Each analysing process gets an equal share of the CPUs for compiling importing files
+importers_check_pool = None
+importers_check_jobs = max(1, multiprocessing.cpu_count() // (args['jobs'] or 1))
 
 files_done = 0
 files_modified = 0
 files_with_suggestions = 0
 
-for f in files:
-    updateProgress(files_done / float(total_files))
+# The costs of analysing files in previous runs are used to schedule the most expensive files first
+cost_file = os.path.join(state_directory, 'file_costs.json')
+file_costs = loadJson(cost_file, "Cost file") or {}
+atexit.register(saveJson, cost_file, file_costs)
 
-    errors = set()
+# The interface files are mirrored by the workspaces as well, as they are edited along with the
+# files they are generated from
+workspace_include_dirs = [arg[2:] for arg in compile_command if arg.startswith("-I")]
 
-    # Make a temporary copy of the file
-    tmp_file = tmp_directory + '/tmp_file'
-    shutil.copyfile(f, tmp_file)
+# Note 'report_only' instead of 'report-only' since the hyphen is automatically converted to an
+# underscore
+journal = None
+if not args['report_only']:
+    journal = open(journal_file, 'a' if args['resume'] else 'w')
 
-    errors = analyseFile(f, compile_command, tmp_directory)
+    # All files are known to compile at this point
+    writeJournalSnapshot(journal)
 
+# Report the files analysed by the interrupted run as if they had been analysed now
+for entry in resumed_entries:
     files_done += 1
 
-    if not filecmp.cmp(f, tmp_file):
+    if entry['modified']:
         files_modified += 1
 
-    if (len(errors)):
-        removeProgressBar()
-
-        if "BUILD FAILURE" in errors:
-            print("One or more changes made in one of the " + str(files_modified) +
-                  " modified files has caused a build failure in:")
-            print("    " + f)
-            print("")
-
-            print("Build command used:")
-            for p in compile_command: print p,
-            print(f)
-            print("")
-
-            print("Please identify this change(s), revert only the relevant change(s), and add " +
-                  "that file to the skiplist.")
-            print("This will prevent the same modification(s) from being performed in the next run.")
-            print("")
-
-            print("Aborting.")
-            sys.exit(4)
-
+    if len(entry['errors']):
         files_with_suggestions += 1
 
-        print(f + ":")
-        for e in errors:
+        print(entry['file'] + ":")
+        for e in entry['errors']:
             print(e)
         print("")
 
+try:
+    analyseAndApplyFiles(files, journal)
+except KeyboardInterrupt:
+    exitInterrupted(journal is not None)
+except BuildFailureException:
+    print("Aborting.")
+    sys.exit(4)
+
 removeProgressBar()
 
+if not args['report_only']:
+    saveAnalysedFiles(state_file, [entry['file'] for entry in resumed_entries] + files)
+
+    # The run is complete, so there is nothing left to resume
+    journal.close()
+    os.remove(journal_file)
+
 print("")
 print("Number of files analysed: " + str(total_files))
-print("Number of files automatically modified: " + str(files_modified))
+if args['report_only']:
+    print("Number of files which can be automatically modified: " + str(files_modified))
+else:
+    print("Number of files automatically modified: " + str(files_modified))
 print("Number of files with suggestions: " + str(files_with_suggestions))
 
-shutil.rmtree(tmp_directory)
+if args['watch']:
+    watchSourceFiles()
+
+if trace_fd is not None:
+    os.close(trace_fd)
+    print("")
+    printTraceSummary(args['trace'])
 
@@ -0,0 +1,563 @@
+#!/usr/bin/python
+
+
+####################################################################################################
+#
+#   Offline benchmark for imports_analyser.py.
+#
+#   A synthetic D project (src/, submodules/*/src and build/devel/include) is generated in a
+#   temporary directory, and imports_analyser.py is run on it with a stand-in for 'dmd1' placed at
+#   the front of $PATH. The stand-in is this very script (invoked with '--stub-dmd' as the first
+#   argument): it decides whether a file compiles purely from the symbols that the file uses and
+#   the symbols made visible by its imports, so no real D compiler is needed.
+#
+#   Usage:
+#       $> ./imports_analyser_bench.py --modules 300 --submodules 4 --fan-out 8 --dead-ratio 0.3
+#       $> ./imports_analyser_bench.py --latency 0.05 -- --jobs 8
+#   (everything after '--' is passed on to imports_analyser.py as is)
+#
+####################################################################################################
+
+
+####################################################################################################
+#
+#   Imports
+#
+####################################################################################################
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import d_lexer
+
+
+
+####################################################################################################
+#
+#   Stub compiler
+#
+####################################################################################################
+
+# Keywords and built-in names which the synthetic sources use and which are never imported
+stub_keywords = set(['alias', 'auto', 'class', 'debug', 'else', 'enum', 'if', 'import', 'int',
+    'interface', 'module', 'new', 'private', 'public', 'return', 'static', 'struct', 'this',
+    'version', 'void'])
+
+# Keywords which are followed by the name of a declaration in the synthetic sources
+stub_declaration_keywords = set(['class', 'struct', 'interface', 'enum', 'void', 'int', 'auto'])
+
+
+####################################################################################################
+#
+#   Function to parse a D source into what the stub compiler needs to know about it.
+#
+#   Params:
+#       text = the D source
+#
+#   Returns:
+#       a tuple of the code tokens of the source (i.e. without comments) and a list of
+#       (module, is_public, alias, bindings) tuples for all imported modules, 'bindings' being
+#       None for imports that are not selective
+#
+####################################################################################################
+
+def stubParse(text):
+    tokens = d_lexer.tokenize(text)
+    imports = []
+
+    for statement in d_lexer.parse_imports(text, tokens):
+        is_public = any(attribute.text == 'public' for attribute in statement.attributes)
+        for module in statement.modules:
+            bindings = None
+            if module.bindings is not None:
+                bindings = [binding.name for binding in module.bindings]
+            imports.append((module.name, is_public, module.alias, bindings))
+
+    return (d_lexer.code_tokens(tokens), imports)
+
+
+####################################################################################################
+#
+#   Function to get the symbols declared by a D source.
+#
+#   Params:
+#       code = the code tokens of the source
+#
+#   Returns:
+#       a set of the declared symbols
+#
+####################################################################################################
+
+def stubDeclarations(code):
+    return set(code[i + 1].text for i in range(len(code) - 1)
+               if code[i].text in stub_declaration_keywords and code[i + 1].kind == 'identifier')
+
+
+####################################################################################################
+#
+#   Function to find the file of the given module in the given import paths.
+#
+#   Params:
+#       module = the module to find
+#       import_paths = directories to search in (in order)
+#
+#   Returns:
+#       the path of the module's file, None if it couldn't be found
+#
+####################################################################################################
+
+def stubFindModule(module, import_paths):
+    relative_path = module.replace('.', '/')
+    for import_path in import_paths:
+        for extension in ('.di', '.d'):
+            candidate = os.path.join(import_path, relative_path + extension)
+            if os.path.isfile(candidate):
+                return candidate
+    return None
+
+
+####################################################################################################
+#
+#   Function to get the symbols that importing the given module makes visible (the module's own
+#   declarations plus whatever it publicly imports).
+#
+#   Params:
+#       module = the imported module
+#       import_paths = directories to search in (in order)
+#       cache = dictionary of already loaded modules
+#       missing = set to which the names of modules that couldn't be found are added
+#
+#   Returns:
+#       a set of visible symbols
+#
+####################################################################################################
+
+def stubModuleSymbols(module, import_paths, cache, missing):
+    if module in cache:
+        return cache[module]
+
+    # Guard against import cycles
+    cache[module] = set()
+
+    path = stubFindModule(module, import_paths)
+    if path is None:
+        missing.add(module)
+        return cache[module]
+
+    with open(path, 'r') as in_file:
+        code, imports = stubParse(in_file.read())
+
+    # dmd1 lets the symbols of private imports leak into importing modules as well (bug 314),
+    # which can optionally be simulated
+    leaky = os.environ.get('STUB_DMD_LEAKY_IMPORTS') == '1'
+
+    symbols = stubDeclarations(code)
+    for imp, is_public, alias, bindings in imports:
+        if (is_public or leaky) and alias is None and bindings is None:
+            symbols |= stubModuleSymbols(imp, import_paths, cache, missing)
+
+    cache[module] = symbols
+    return symbols
+
+
+####################################################################################################
+#
+#   Function to "compile" a single file.
+#
+#   Params:
+#       filename = the file to compile
+#       import_paths = directories to search for imported modules in (in order)
+#       cache = dictionary of already loaded modules
+#
+#   Returns:
+#       a list of error messages (empty if the file compiles)
+#
+####################################################################################################
+
+def stubCompile(filename, import_paths, cache):
+    with open(filename, 'r') as in_file:
+        text = in_file.read()
+
+    code, imports = stubParse(text)
+
+    errors = []
+    missing = set()
+
+    visible = stubDeclarations(code)
+    for imp, is_public, alias, bindings in imports:
+        symbols = stubModuleSymbols(imp, import_paths, cache, missing)
+        if alias is not None:
+            visible.add(alias)
+        elif bindings is not None:
+            for b in bindings:
+                if b not in symbols:
+                    errors.append(filename + "(1): Error: import '" + b + "' not found")
+                visible.update(bindings)
+        else:
+            visible |= symbols
+
+    for module in sorted(missing):
+        errors.append(filename + ": Error: module " + module.split('.')[-1] +
+            " cannot read file '" + module.replace('.', '/') + ".d'")
+
+    # The names in the module declaration and the import statements need not be visible
+    skipped_spans = [(statement.start, statement.end)
+                     for statement in d_lexer.parse_imports(text)]
+    for i, token in enumerate(code):
+        if token.text == 'module':
+            end = d_lexer.parse_qualified_name(code, i + 1)[1]
+            if end < len(code):
+                skipped_spans.append((token.start, code[end].end))
+            break
+    skipped_spans.sort()
+
+    reported = set()
+    span_index = 0
+    for i, token in enumerate(code):
+        while span_index < len(skipped_spans) and skipped_spans[span_index][1] <= token.start:
+            span_index += 1
+        if span_index < len(skipped_spans) and skipped_spans[span_index][0] <= token.start:
+            continue
+
+        if token.kind != 'identifier':
+            continue
+        if i > 0 and code[i - 1].text == '.':
+            # A member access, e.g. 'Foo.bar', only 'Foo' needs to be visible
+            continue
+
+        identifier = token.text
+        if identifier in stub_keywords or identifier in visible or identifier in reported:
+            continue
+
+        reported.add(identifier)
+        line_num = text.count('\n', 0, token.start) + 1
+        errors.append(filename + "(" + str(line_num) + "): Error: undefined identifier " +
+            identifier)
+
+    return errors
+
+
+####################################################################################################
+#
+#   Entry point of the stub compiler. Understands the subset of the dmd1 command line used by
+#   imports_analyser.py: '-I<path>', '-H', '-Hd<dir>', '-Hf<file>', '-X', '-Xf<file>' and any
+#   number of source files. All other flags are ignored. The behaviour of the stub is controlled by
+#   the following environment variables:
+#       STUB_DMD_LATENCY = seconds of start-up latency to simulate per invocation
+#       STUB_DMD_LOG = file in which every invocation is recorded
+#       STUB_DMD_LEAKY_IMPORTS = if '1', the symbols of private imports leak into importing
+#                                modules (like dmd1 bug 314)
+#
+#   Params:
+#       argv = the command line arguments (without the program name)
+#
+#   Returns:
+#       the exit code of the "compilation"
+#
+####################################################################################################
+
+def stubDmdMain(argv):
+    import_paths = []
+    files = []
+    header_dir = None
+    header_file = None
+    json_file = None
+    generate_json = False
+
+    for arg in argv:
+        if arg.startswith('-I'):
+            import_paths.append(arg[2:])
+        elif arg.startswith('-Hd'):
+            header_dir = arg[3:]
+        elif arg.startswith('-Hf'):
+            header_file = arg[3:]
+        elif arg.startswith('-Xf'):
+            json_file = arg[3:]
+        elif arg == '-X':
+            generate_json = True
+        elif not arg.startswith('-'):
+            files.append(arg)
+
+    latency = float(os.environ.get('STUB_DMD_LATENCY', '0'))
+    if latency > 0:
+        time.sleep(latency)
+
+    log_file = os.environ.get('STUB_DMD_LOG')
+    if log_file:
+        with open(log_file, 'a') as out_file:
+            out_file.write(str(len(files)) + '\n')
+
+    cache = {}
+    errors = []
+    json_modules = []
+
+    for filename in files:
+        errors += stubCompile(filename, import_paths, cache)
+
+        with open(filename, 'r') as in_file:
+            source = in_file.read()
+        code = stubParse(source)[0]
+        module = (d_lexer.parse_module_name(source) or
+                  os.path.splitext(os.path.basename(filename))[0])
+
+        if header_file is not None or header_dir is not None:
+            # The interface file is just a copy of the source (dmd1 names it after the source file)
+            header = header_file
+            if header is None:
+                header = os.path.join(header_dir, os.path.splitext(os.path.basename(filename))[0] +
+                    '.di')
+            with open(header, 'w') as out_file:
+                out_file.write(source)
+
+        if generate_json or json_file:
+            members = [{'name': name, 'kind': 'class'} for name in sorted(stubDeclarations(code))]
+            json_modules.append({'name': module, 'file': filename, 'kind': 'module',
+                                 'members': members})
+
+    if json_file:
+        with open(json_file, 'w') as out_file:
+            json.dump(json_modules, out_file)
+
+    for error in errors:
+        sys.stderr.write(error + '\n')
+
+    return 1 if errors else 0
+
+
+####################################################################################################
+#
+#   Synthetic project generation
+#
+####################################################################################################
+
+####################################################################################################
+#
+#   Function to generate the source of a single synthetic module.
+#
+#   Params:
+#       module = name of the module
+#       live_imports = modules which are imported and used
+#       dead_imports = modules which are imported but not used
+#       rng = random number generator
+#       duplicate_ratio = probability of an import being repeated
+#
+#   Returns:
+#       the D source of the module
+#
+####################################################################################################
+
+def generateModule(module, live_imports, dead_imports, rng, duplicate_ratio):
+    name = module.split('.')[-1]
+
+    all_imports = live_imports + dead_imports
+    rng.shuffle(all_imports)
+
+    lines = []
+    lines.append('/*' + '*' * 78)
+    lines.append('')
+    lines.append('    Synthetic module ' + module)
+    lines.append('')
+    lines.append('*' * 79 + '/')
+    lines.append('')
+    lines.append('module ' + module + ';')
+    lines.append('')
+    for imp in all_imports:
+        lines.append('import ' + imp + ';')
+        if rng.random() < duplicate_ratio:
+            lines.append('import ' + imp + ';')
+    lines.append('')
+    lines.append('class ' + name)
+    lines.append('{')
+    lines.append('    void run ( )')
+    lines.append('    {')
+    for i, imp in enumerate(live_imports):
+        imp_name = imp.split('.')[-1]
+        if i % 3 == 2:
+            # Use only a free function of the module, which makes the import removable only by
+            # turning it into a selective import
+            lines.append('        auto v' + str(i) + ' = helper' + imp_name + '();')
+        else:
+            lines.append('        ' + imp_name + '.touch();')
+    lines.append('    }')
+    lines.append('}')
+    lines.append('')
+    lines.append('int helper' + name + ' ( )')
+    lines.append('{')
+    lines.append('    return 0;')
+    lines.append('}')
+    lines.append('')
+
+    return '\n'.join(lines)
+
+
+####################################################################################################
+#
+#   Function to generate a synthetic D project.
+#
+#   Params:
+#       root = directory in which to generate the project
+#       num_modules = number of modules in src/
+#       num_submodules = number of submodules
+#       modules_per_submodule = number of modules in each submodule
+#       fan_out = number of imports per module
+#       dead_ratio = fraction of the imports which are not used
+#       duplicate_ratio = probability of an import being repeated
+#       seed = seed for the random number generator
+#
+####################################################################################################
+
+def generateProject(root, num_modules, num_submodules, modules_per_submodule, fan_out, dead_ratio,
+                    duplicate_ratio, seed):
+    rng = random.Random(seed)
+
+    # Submodule modules only import other modules of the same submodule (and only those with a
+    # lower index, so that the dependencies form a DAG)
+    library_modules = []
+    for s in range(num_submodules):
+        sub = 'sub' + str(s)
+        sub_modules = []
+        for m in range(modules_per_submodule):
+            module = sub + '.lib.Sub' + str(s) + 'Mod' + str(m)
+            live = rng.sample(sub_modules, min(len(sub_modules), 2))
+            path = os.path.join(root, 'submodules', sub, 'src', module.replace('.', '/') + '.d')
+            writeSource(path, generateModule(module, live, [], rng, 0))
+            sub_modules.append(module)
+        library_modules += sub_modules
+
+    os.makedirs(os.path.join(root, 'build', 'devel', 'include'))
+
+    src_modules = []
+    num_packages = max(1, num_modules // 25)
+    for m in range(num_modules):
+        module = 'app.pkg' + str(m % num_packages) + '.Mod' + str(m)
+        candidates = library_modules + src_modules
+        count = min(len(candidates), fan_out)
+        imports = rng.sample(candidates, count)
+        num_dead = int(round(count * dead_ratio))
+        live, dead = imports[num_dead:], imports[:num_dead]
+        path = os.path.join(root, 'src', module.replace('.', '/') + '.d')
+        writeSource(path, generateModule(module, live, dead, rng, duplicate_ratio))
+        src_modules.append(module)
+
+
+####################################################################################################
+#
+#   Function to write a source file, creating its directory if needed.
+#
+#   Params:
+#       path = the file to write
+#       text = the contents of the file
+#
+####################################################################################################
+
+def writeSource(path, text):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as out_file:
+        out_file.write(text)
+
+
+####################################################################################################
+#
+#    Execution starts here! [main :)]
+#
+####################################################################################################
+
+if len(sys.argv) > 1 and sys.argv[1] == '--stub-dmd':
+    sys.exit(stubDmdMain(sys.argv[2:]))
+
+parser = argparse.ArgumentParser(usage='./%(prog)s [ARGUMENTS] [-- ANALYSER ARGUMENTS]',
+    description='Imports Analyser Benchmark')
+parser.add_argument('-m', '--modules', type=int, default=200,
+    help='Number of modules in src/ (default: %(default)s)')
+parser.add_argument('-s', '--submodules', type=int, default=3,
+    help='Number of submodules (default: %(default)s)')
+parser.add_argument('--submodule-size', type=int, default=20,
+    help='Number of modules in each submodule (default: %(default)s)')
+parser.add_argument('-f', '--fan-out', type=int, default=6,
+    help='Number of imports per module (default: %(default)s)')
+parser.add_argument('-d', '--dead-ratio', type=float, default=0.3,
+    help='Fraction of imports which are unused (default: %(default)s)')
+parser.add_argument('--duplicate-ratio', type=float, default=0.05,
+    help='Probability of an import being duplicated (default: %(default)s)')
+parser.add_argument('-l', '--latency', type=float, default=0.0,
+    help='Simulated start-up latency of each compiler run in seconds (default: %(default)s)')
+parser.add_argument('--seed', type=int, default=1,
+    help='Seed for generating the synthetic project (default: %(default)s)')
+parser.add_argument('-k', '--keep', action='store_true', default=False,
+    help='Keep the generated project instead of deleting it')
+parser.add_argument('-p', '--python', default=sys.executable,
+    help='Python interpreter with which to run imports_analyser.py (default: %(default)s)')
+parser.add_argument('analyser_args', nargs=argparse.REMAINDER,
+    help='Arguments to pass on to imports_analyser.py')
+args = vars(parser.parse_args())
+
+analyser_args = args['analyser_args']
+if analyser_args and analyser_args[0] == '--':
+    analyser_args = analyser_args[1:]
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+work_dir = tempfile.mkdtemp(prefix='imports_analyser_bench.')
+project_dir = os.path.join(work_dir, 'project')
+bin_dir = os.path.join(work_dir, 'bin')
+log_file = os.path.join(work_dir, 'compiles.log')
+
+os.makedirs(bin_dir)
+with open(os.path.join(bin_dir, 'dmd1'), 'w') as out_file:
+    out_file.write('#!/bin/sh\n')
+    out_file.write('exec "' + sys.executable + '" "' + os.path.abspath(__file__) +
+        '" --stub-dmd "$@"\n')
+os.chmod(os.path.join(bin_dir, 'dmd1'), 0o755)
+
+print("Generating synthetic project in " + project_dir + " ...")
+generateProject(project_dir, args['modules'], args['submodules'], args['submodule_size'],
+    args['fan_out'], args['dead_ratio'], args['duplicate_ratio'], args['seed'])
+
+env = dict(os.environ)
+env['PATH'] = bin_dir + os.pathsep + env.get('PATH', '')
+env['STUB_DMD_LATENCY'] = str(args['latency'])
+env['STUB_DMD_LOG'] = log_file
+# Keep the analyser's state (including its compile cache) inside the work directory, so that every
+# run starts with an empty cache and nothing is left behind in the user's own cache directory
+env['XDG_CACHE_HOME'] = os.path.join(work_dir, 'cache')
+
+command = [args['python'], os.path.join(script_dir, 'imports_analyser.py')] + analyser_args
+print("Running: " + ' '.join(command))
+print("")
+
+start = time.time()
+with open(os.devnull, 'w') as devnull:
+    return_code = subprocess.call(command, cwd=project_dir, env=env, stdout=devnull)
+wall_time = time.time() - start
+
+compiler_runs = 0
+files_compiled = 0
+if os.path.isfile(log_file):
+    with open(log_file, 'r') as in_file:
+        for line in in_file:
+            compiler_runs += 1
+            files_compiled += int(line)
+
+print("Analyser exit code    : " + str(return_code))
+print("Wall time             : " + '%.2f' % wall_time + " s")
+print("Compiler runs         : " + str(compiler_runs))
+print("Files compiled        : " + str(files_compiled))
+if wall_time > 0:
+    print("Compiler runs per sec : " + '%.1f' % (compiler_runs / wall_time))
+
+if args['keep']:
+    print("")
+    print("Generated project kept in " + project_dir)
+else:
+    shutil.rmtree(work_dir)
+
+sys.exit(return_code)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+################################################################################
+#
+#   Description:
+#   ------------
+#       Minimal bindings for the Linux inotify API (using ctypes), to watch
+#       directory trees for changes to the files within them.
+#
+################################################################################
+
+import collections
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+
+
+# Event masks (see 'man 7 inotify')
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+# Flag of 'inotify_init1()'
+IN_CLOEXEC = 0o2000000
+
+# Header of an event read from an inotify file descriptor: the watch
+# descriptor, the mask, the cookie and the length of the name following it
+event_header = struct.Struct('iIII')
+
+
+################################################################################
+#
+#   A single inotify event. 'name' is the name of the file (within the watched
+#   directory) the event is about, empty if the event is about the watched
+#   directory itself.
+#
+################################################################################
+
+Event = collections.namedtuple('Event', ['wd', 'mask', 'cookie', 'name'])
+
+
+libc = None
+
+
+################################################################################
+#
+#   Gets the C library, loading it on first use
+#
+#   Returns:
+#       the C library
+#
+################################################################################
+
+def get_libc():
+    global libc
+
+    if libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+
+    return libc
+
+
+################################################################################
+#
+#   Raises an OSError for the error of the most recent call into the C library
+#
+#   Params:
+#       path = the path the call was about (optional)
+#
+################################################################################
+
+def raise_error(path=None):
+    error = ctypes.get_errno()
+    raise OSError(error, os.strerror(error), path)
+
+
+################################################################################
+#
+#   Creates a new inotify instance
+#
+#   Returns:
+#       the file descriptor of the instance
+#
+#   Throws:
+#       OSError if the instance couldn't be created
+#
+################################################################################
+
+def init():
+    fd = get_libc().inotify_init1(IN_CLOEXEC)
+    if fd < 0:
+        raise_error()
+    return fd
+
+
+################################################################################
+#
+#   Adds a watch for a single file or directory
+#
+#   Params:
+#       fd = the file descriptor of the inotify instance
+#       path = the path to watch
+#       mask = the events to watch for
+#
+#   Returns:
+#       the watch descriptor
+#
+#   Throws:
+#       OSError if the watch couldn't be added
+#
+################################################################################
+
+def add_watch(fd, path, mask):
+    encoded_path = path
+    if not isinstance(encoded_path, bytes):
+        encoded_path = encoded_path.encode(sys.getfilesystemencoding())
+
+    wd = get_libc().inotify_add_watch(fd, encoded_path, mask)
+    if wd < 0:
+        raise_error(path)
+    return wd
+
+
+################################################################################
+#
+#   Adds watches for a directory and all directories below it. Directories
+#   which disappear while the tree is being walked are skipped.
+#
+#   Params:
+#       fd = the file descriptor of the inotify instance
+#       top = the top directory of the tree
+#       mask = the events to watch for
+#       watches = dictionary to which each added watch descriptor is added,
+#                 mapped to the path of its directory
+#
+################################################################################
+
+def add_tree_watches(fd, top, mask, watches):
+    for root, subdirs, filenames in os.walk(top):
+        try:
+            watches[add_watch(fd, root, mask)] = root
+        except OSError as e:
+            if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+
+
+################################################################################
+#
+#   Reads the pending events of an inotify instance, waiting for events if
+#   there are none
+#
+#   Params:
+#       fd = the file descriptor of the inotify instance
+#       timeout = seconds to wait for events (None to wait forever)
+#
+#   Returns:
+#       a list of 'Event's (empty if the timeout expired)
+#
+################################################################################
+
+def read_events(fd, timeout=None):
+    readable, _, _ = select.select([fd], [], [], timeout)
+    if not readable:
+        return []
+
+    data = os.read(fd, 65536)
+    events = []
+    offset = 0
+
+    while offset + event_header.size <= len(data):
+        wd, mask, cookie, length = event_header.unpack_from(data, offset)
+        offset += event_header.size
+
+        name = data[offset:offset + length].rstrip(b'\0')
+        if not isinstance(name, str):
+            name = name.decode(sys.getfilesystemencoding())
+        offset += length
+
+        events.append(Event(wd, mask, cookie, name))
+
+    return events
+
+
+# vim: set tw=80 :
@@ -38,6 +38,8 @@ import os
 import re
 import sys
 
+import file_finder
+import git
 
 
 ####################################################################################################
@@ -197,15 +199,24 @@ parser.add_argument('-u', '--us-english', action='store_true',
 parser.add_argument('-w', '--whitelist', nargs='?',
                     required = False, default = "",
                     help = 'Provide a whitelist file')
+parser.add_argument('--changed-since', required = False, default = None, metavar = 'REF',
+                    help = 'Only check files changed since the given git reference')
 args = vars(parser.parse_args())
 
-cwd = os.getcwd()
+# Note 'changed_since' instead of 'changed-since' since the hyphen is automatically converted to an
+# underscore
+if args['changed_since'] and not git.is_valid_commit(args['changed_since']):
+    print("'" + args['changed_since'] + "' is not a valid git commit. Aborting.")
+    sys.exit(1)
+
+files = file_finder.find_files(filter_supported_files)
 
-files = []
+if args['changed_since']:
+    files &= file_finder.find_changed_files(args['changed_since'])
 
-for root, subdirs, filenames in os.walk(cwd):
-    for filename in filter_supported_files(filenames):
-        files.append(os.path.join(root, filename))
+# Always check the files in the same order, so that skipping files (see '--skip-count') skips the
+# same files every time
+files = sorted(files)
 
 total_files = len(files)
 